@@ -0,0 +1,50 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:40:08 2026
+
+@author: phunh
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models import ColumnarPointCollection
+
+def _worker(directory):
+   """Open the store and read all the coordinates
+   """
+   start = time.time()
+   collection = ColumnarPointCollection.open(directory)
+   opened = time.time() - start
+   total = float(collection.x.sum() + collection.y.sum())
+   return opened, total
+
+def compare_startup(file_path, directory, workers=4):
+   """Print the time to import a file and the time to open its store
+   :param str file_path: The full path to the file
+   :param str directory: The directory of the store
+   :param int workers: Number of processes opening the store
+   """
+   start = time.time()
+   collection = ColumnarPointCollection(file_path)
+   print("  import: {:.3f}s".format(time.time() - start))
+   start = time.time()
+   collection.save(directory)
+   print("  save: {:.3f}s".format(time.time() - start))
+   pool = Pool(workers)
+   try:
+      results = pool.map(_worker, [directory] * workers)
+   finally:
+      pool.close()
+      pool.join()
+   for opened, total in results:
+      print("  open in a worker: {:.4f}s".format(opened))
+
+if __name__ == '__main__':
+   compare_startup('../../data/geocaching.gpx', '../output/geocaching_store')
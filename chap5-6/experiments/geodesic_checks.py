@@ -0,0 +1,45 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 09:12:44 2026
+
+@author: phunh
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+from shapely.geometry import Polygon
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from utils.geodesic import geometry_areas
+
+def _parallel(lat, start, end, step=1.0):
+   return [(lon, lat) for lon in np.arange(start, end + step / 2, step)]
+
+# Polygons with their area on the WGS84 ellipsoid in square kilometers.
+# The caps are bounded by parallels, their edges are great circle arcs
+CASES = [
+   ("1x1 degree square on the equator",
+    Polygon([(0, 0), (1, 0), (1, 1), (0, 1)]), 12308.78),
+   ("Cap north of 80N",
+    Polygon(_parallel(80, -180, 180)), 3908572.76),
+   ("Antarctica shape, south of 70S",
+    Polygon(_parallel(-70, -180, 180) + [(180, -90), (-180, -90)]), 15506340.67),
+   ("Cap south of 70S without the pole edge",
+    Polygon(_parallel(-70, 180, -180, -1.0)), 15506340.67)]
+
+def check_areas(tolerance=0.001):
+   """Print the computed and the expected areas of the cases
+   :param float tolerance: Accepted relative error
+   """
+   areas = geometry_areas([case[1] for case in CASES]) / 1e6
+   for (name, polygon, expected), area in zip(CASES, areas):
+      status = 'ok' if abs(area - expected) <= tolerance * expected else 'WRONG'
+      print("  {}: {:.2f} km2, expected {:.2f} km2 {}".format(
+         name, area, expected, status))
+
+if __name__ == '__main__':
+   check_areas()
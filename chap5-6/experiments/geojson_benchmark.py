@@ -0,0 +1,47 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 18:40:12 2026
+
+@author: phunh
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+try:
+   import tracemalloc
+except ImportError:
+   tracemalloc = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models import PointCollection
+
+def measure_export(collection, file_path, **kwargs):
+   """Export a collection and print the time, the size of the file
+   and the peak memory used while exporting
+   :param collection: A BaseGeoCollection subclass instance
+   :param str file_path: Path of the output file
+   """
+   if tracemalloc:
+      tracemalloc.start()
+   start = time.time()
+   collection.export_geojson(file_path, **kwargs)
+   elapsed = time.time() - start
+   peak = tracemalloc.get_traced_memory()[1] if tracemalloc else None
+   if tracemalloc:
+      tracemalloc.stop()
+   size = os.path.getsize(file_path)
+   count = len(collection.data)
+   print("  {}: {:.3f}s, {:.0f} features/s, {:.1f} MB".format(
+      kwargs, elapsed, count / elapsed, size / 1e6))
+   if peak is not None:
+      print("    peak memory: {:.1f} MB".format(peak / 1e6))
+
+if __name__ == '__main__':
+   gpx_data = PointCollection('../../data/geocaching.gpx')
+   measure_export(gpx_data, '../output/data_indent.json')
+   measure_export(gpx_data, '../output/data_compact.json', indent=None)
+   measure_export(gpx_data, '../output/data.geojsonl', newline_delimited=True)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:10:51 2026
+
+@author: phunh
+"""
+
+from __future__ import print_function
+
+import gc
+import os
+import sys
+try:
+   import tracemalloc
+except ImportError:
+   tracemalloc = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models import PointCollection, BoundaryCollection
+
+def measure_objects(collection_class, file_path):
+   """Import a file and print the memory allocated by Python
+   for each feature of the collection
+   :param collection_class: A BaseGeoCollection subclass
+   :param str file_path: The full path to the file
+   """
+   if tracemalloc is None:
+      print("tracemalloc is needed to measure the memory")
+      return
+   gc.collect()
+   tracemalloc.start()
+   before = tracemalloc.get_traced_memory()[0]
+   collection = collection_class(file_path)
+   gc.collect()
+   used = tracemalloc.get_traced_memory()[0] - before
+   tracemalloc.stop()
+   count = len(collection.data)
+   print("  {}: {} features, {:.0f} bytes per feature".format(
+      file_path, count, used / float(max(count, 1))))
+
+if __name__ == '__main__':
+   measure_objects(PointCollection, '../../data/geocaching.gpx')
+   measure_objects(BoundaryCollection, '../../data/world_borders_simple.shp')
@@ -0,0 +1,49 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:12:40 2026
+
+@author: phunh
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+import ogr
+from shapely import wkb, wkt
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from utils.geo_functions import read_ogr_features
+
+def load_geometries(file_path, geometry_format):
+   """Read all the features of a file and load their geometries with shapely
+   :param str file_path: The full path to the file
+   :param str geometry_format: 'wkt' or 'wkb'
+   """
+   datasource = ogr.Open(file_path)
+   layer = datasource.GetLayerByIndex(0)
+   features = read_ogr_features(layer, geometry_format)
+   loads = wkb.loads if geometry_format == 'wkb' else wkt.loads
+   return [loads(f['geometry']['coordinates']) for f in features]
+
+def compare_formats(file_path, repeat=5):
+   """Print the time of the WKT and the WKB paths and check the results
+   :param str file_path: The full path to the file
+   :param int repeat: Number of runs, the best one is printed
+   """
+   print(file_path)
+   for geometry_format in ('wkt', 'wkb'):
+      timer = timeit.Timer(lambda: load_geometries(file_path, geometry_format))
+      best = min(timer.repeat(repeat=repeat, number=1))
+      print("  {}: {:.3f}s".format(geometry_format, best))
+   # WKB keeps the full precision of the coordinates, WKT doesn't
+   wkt_geoms = load_geometries(file_path, 'wkt')
+   wkb_geoms = load_geometries(file_path, 'wkb')
+   exact = sum(1 for a, b in zip(wkt_geoms, wkb_geoms) if a.equals_exact(b, 0))
+   print("  identical geometries: {}/{}".format(exact, len(wkb_geoms)))
+
+if __name__ == '__main__':
+   compare_formats('../../data/world_borders_simple.shp')
+   compare_formats('../../data/roads.shp')
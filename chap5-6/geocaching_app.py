@@ -6,24 +6,35 @@ Created on Thu Apr 18 14:08:55 2019
 @author: phunh
 """
 
+from __future__ import print_function
 from utils.geo_functions import transform_points
+from utils.geodesic import distances_to_point, haversine
+from utils.geodesic import unit_vectors, distance_to_chord
 from models import PointCollection, BoundaryCollection
 
 import numpy as np
-import math
+from scipy.spatial import cKDTree
 
 class GeocachingApp(object):
-   def __init__(self, geocaching_file=None, boundary_file=None, my_location=None):
+   def __init__(self, geocaching_file=None, boundary_file=None, my_location=None,
+                cache_dir=None):
       """Application class
       :param geocaching_file: An OGR compatible file with geocaching points
       :param boundary_file: A file with boundaries
       :param my_location: Coordinates of your location
+      :param cache_dir: Optional directory of the import cache
       """
-      self.geocaching_data = PointCollection(geocaching_file)
-      self.boundaries = BoundaryCollection(boundary_file)
+      self.geocaching_data = PointCollection(geocaching_file,
+                                             cache_dir=cache_dir)
+      self.boundaries = BoundaryCollection(boundary_file, cache_dir=cache_dir)
       self._my_location = None
+      self._my_coordinates = None
       if my_location:
-         self._my_location = my_location
+         self.my_location = my_location
+      self._caches_index = None
+      self._indexed_coordinates = None
+      self._indexed_data = None
+      self._indexed_revision = None
          
    @property
    def my_location(self):
@@ -31,41 +42,117 @@ class GeocachingApp(object):
    
    @my_location.setter
    def my_location(self, coordinates):
+      self._my_coordinates = coordinates
       self._my_location = transform_points([coordinates])[0]
-         
-   def open_file(self, file_path):
-      """Open a file containing geocaching data and prepare it for use
-      :param file_path:
-      """
-      self._datasource = open_vector_file(file_path)
-      self._transformed_geoms = transform_geometries(self._datasource, 4326, 3395)
 
-   def calculate_distances(self):
+   def calculate_distances(self, method='haversine'):
       """Calculate the distance between a set of points and a give location
-      :return: A list of distances in the same order as the points
+      directly from their longitudes and latitudes
+      :param str method: 'haversine' (sphere) or 'vincenty' (WGS84 ellipsoid)
+      :return: An array of distances in meters in the same order as the points
+      """
+      if self.my_location is None:
+         raise ValueError("The location is not set")
+      lon, lat = self._my_coordinates[:2]
+      points = self.geocaching_data.coordinates()
+      return distances_to_point(lon, lat, points[:, 0], points[:, 1], method)
+   
+   @property
+   def caches_index(self):
+      """KD-tree over the unit_vectors of the geocaching points, the
+      chords between the vectors grow with the great circle distances.
+      It's rebuilt only when geocaching_data changes
+      """
+      data = self.geocaching_data
+      # The size catches the points appended without calling invalidate
+      state = (data.revision, len(data.data))
+      if self._indexed_data is not data or self._indexed_revision != state:
+         coordinates = data.coordinates()
+         self._caches_index = cKDTree(unit_vectors(coordinates[:, 0],
+                                                   coordinates[:, 1]))
+         self._indexed_coordinates = coordinates
+         self._indexed_data = data
+         self._indexed_revision = state
+      return self._caches_index
+   
+   def _get_location(self):
+      """Return the unit vector of the location
+      """
+      if self.my_location is None:
+         raise ValueError("The location is not set")
+      lon, lat = self._my_coordinates[:2]
+      return unit_vectors(lon, lat)[0]
+   
+   def _caches_with_distances(self, positions):
+      """Return a list of (Geocache, distance in meters) sorted by distance
+      :param positions: Positions of the caches in the KD-tree
       """
-      xa = self.my_location[0]
-      ya = self.my_location[1]
-      points = self._transformed_geoms
-      distances = []
-      for geom in points:
-         point_distance = math.sqrt((geom.GetX() - xa)**2 + (geom.GetY() - ya)**2)
-         distances.append(point_distance)
-      return distances
+      positions = np.asarray(positions, dtype=np.intp)
+      points = self._indexed_coordinates[positions]
+      lon, lat = self._my_coordinates[:2]
+      distances = distances_to_point(lon, lat, points[:, 0], points[:, 1])
+      data = self.geocaching_data.data
+      return [(data[positions[i]], distances[i])
+              for i in np.argsort(distances, kind='mergesort')]
    
    def find_closest_point(self):
       """Find the closest point to a given location and return the cache that's on the point
-      :return: OGR feature containing the point
+      :return: Geocache
       """
-      # Part 1
-      distances = self.calculate_distances()
-      index = np.argmin(distances)
-      
-      # Part 2
-      layer = self._datasource.GetLayerByIndex(0)
-      feature = layer.GetFeature(index)
-      print "Closest point at: {}m".format(distances[index])
-      return feature
+      geocache, distance = self.find_nearest(1)[0]
+      print("Closest point at: {}m".format(distance))
+      return geocache
+   
+   def find_nearest(self, k=1):
+      """Find the k caches closest to the location
+      :param int k: Number of caches
+      :return: A list of (Geocache, distance in meters) sorted by distance
+      """
+      k = min(k, len(self.geocaching_data.data))
+      if not k:
+         return []
+      chords, indices = self.caches_index.query(self._get_location(), k=k)
+      return self._caches_with_distances(np.atleast_1d(indices))
+   
+   def find_nearest_batch(self, locations, k=1, workers=None):
+      """Find the k caches closest to each one of many locations.
+      The locations are converted with a single call and queried
+      together, the KD-tree splits them among its worker threads
+      :param locations: A list or an (N, 2) array of [lon, lat] coordinates
+      :param int k: Number of caches per location
+      :param workers: Number of threads, None for the number of CPUs
+      :return: An (N, k) array of great circle distances in meters and
+      a list with the k closest Geocache objects of each location
+      """
+      locations = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+      k = min(k, len(self.geocaching_data.data))
+      if not k or not len(locations):
+         return np.empty((len(locations), 0)), [[] for _ in locations]
+      vectors = unit_vectors(locations[:, 0], locations[:, 1])
+      workers = -1 if workers is None else workers
+      try:
+         chords, indices = self.caches_index.query(vectors, k=k,
+                                                   workers=workers)
+      except TypeError:
+         # SciPy < 1.6 names the argument n_jobs
+         chords, indices = self.caches_index.query(vectors, k=k,
+                                                   n_jobs=workers)
+      indices = indices.reshape(len(vectors), k)
+      points = self._indexed_coordinates[indices]
+      distances = haversine(locations[:, :1], locations[:, 1:],
+                            points[:, :, 0], points[:, :, 1])
+      data = self.geocaching_data.data
+      caches = [[data[index] for index in row] for row in indices]
+      return distances, caches
+   
+   def find_within_radius(self, radius):
+      """Find all the caches within a great circle distance from the location
+      :param radius: Radius in meters
+      :return: A list of (Geocache, distance in meters) sorted by distance
+      """
+      positions = self.caches_index.query_ball_point(self._get_location(),
+                                                     distance_to_chord(radius))
+      return self._caches_with_distances(positions)
    
    def filter_by_country(self, name):
       """Filter by a country with a given name
@@ -75,10 +162,21 @@ class GeocachingApp(object):
       boundary = self.boundaries.get_by_name(name)
       return self.geocaching_data.filter_by_boundary(boundary)
 
+   def count_by_country(self, processes=None):
+      """Count the geocaches in each boundary with a single spatial join
+      :param int processes: Number of processes, None for the number of CPUs
+      :return: A dictionary with the number of geocaches by boundary name
+      """
+      indices, counts = self.geocaching_data.spatial_join(self.boundaries,
+                                                          processes)
+      return dict((boundary.get_attribute('name'), int(count))
+                  for boundary, count in zip(self.boundaries.data, counts))
+
 if __name__ == "__main__":
    geocaching_file = '../data/geocaching.gpx'
    boundary_file = '../data/world_borders_simple.shp'
    # geocaching_file, [-73.0, 43.0]
-   my_app = GeocachingApp(geocaching_file, boundary_file)
+   my_app = GeocachingApp(geocaching_file, boundary_file,
+                          cache_dir='../data/cache')
    result = my_app.filter_by_country('United States')
    print(result)
\ No newline at end of file
@@ -6,29 +6,111 @@ Created on Wed Apr 18 00:01:21 2019
 @author: phunh
 """
 
+import json
+import numbers
+import datetime
+import itertools
 import mapnik
-from models import PointCollection, BoundaryCollection
+from models import PointCollection, LineStringCollection, BoundaryCollection
+try:
+   basestring
+except NameError:
+   basestring = str
+
+# Value passed to mapnik.Python to create a MapDatasource
+FACTORY = 'map_maker.my_datasource:MapDatasource'
+
+# Collections shown by the datasources, by key. mapnik.Python only
+# passes strings to the factory so the collections are passed by key
+_collections = {}
+_keys = itertools.count(1)
+
+def register_collection(collection):
+   """Make a collection available to MapDatasource
+   :param collection: A BaseGeoCollection subclass instance
+   :return: The key to pass to mapnik.Python as data
+   """
+   key = str(next(_keys))
+   _collections[key] = collection
+   return key
+
+def unregister_collection(key):
+   """Release a collection registered with register_collection
+   """
+   _collections.pop(key, None)
+
+def create_datasource(collection):
+   """Create a Mapnik datasource that reads a collection in memory
+   :param collection: A BaseGeoCollection subclass instance
+   :return: The datasource and the key of the collection
+   """
+   key = register_collection(collection)
+   return mapnik.Python(factory=FACTORY, data=key), key
+
+def _mapnik_value(value):
+   """Convert an attribute value into a type Mapnik can store.
+   Nested values are converted into JSON texts
+   """
+   if isinstance(value, (numbers.Real, basestring)):
+      return value
+   if isinstance(value, (datetime.date, datetime.time)):
+      return value.isoformat()
+   return json.dumps(value)
+
+def _mapnik_attributes(attributes):
+   return dict((key, _mapnik_value(value))
+               for key, value in attributes.items() if value is not None)
 
 class MapDatasource(mapnik.PythonDatasource):
-   """Implement Mapnik's PythonDatasource
+   """Implement Mapnik's PythonDatasource.
+   The features are created from the collection while Mapnik reads them
    """
    def __init__(self, data):
-      print(data)
+      """
+      :param data: The key of a collection registered with
+      register_collection or the collection itself
+      """
+      if isinstance(data, basestring):
+         data = _collections[data]
       data_type = mapnik.DataType.Vector
       if isinstance(data, PointCollection):
          geometry_type = mapnik.GeometryType.Point
+      elif isinstance(data, LineStringCollection):
+         geometry_type = mapnik.GeometryType.LineString
       elif isinstance(data, BoundaryCollection):
          geometry_type = mapnik.GeometryType.Polygon
       else:
-         raise TypeError
-         
-      super(MapDatasource, self).__init__(envelope=None,
+         raise TypeError("Unsupported collection: {}".format(type(data)))
+
+      bounds = data.bounds()
+      envelope = mapnik.Box2d(*bounds) if bounds else mapnik.Box2d()
+      super(MapDatasource, self).__init__(envelope=envelope,
            geometry_type=geometry_type, data_type=data_type)
       self.data = data
-   
+      self._keys = None
+      
+   def _attribute_names(self):
+      """Return the attribute names of the collection, found again
+      only when the data changes since it goes through all the items
+      """
+      # The size catches the items appended without calling invalidate
+      state = (self.data.revision, len(self.data.data))
+      if self._keys is None or self._keys[0] != state:
+         self._keys = (state, self.data.attribute_names())
+      return self._keys[1]
+
    def features(self, query=None):
-      keys = ['name',]
-      features = []
-      for item in self.data.data:
-         features.append([item.geom.wkb, {'name': item.name}])
-      return mapnik.PythonDatasource.wkb_features(keys, features)
\ No newline at end of file
+      """Return the features that intersect the bbox of the query,
+      found with the spatial index of the collection
+      :param query: A Mapnik query or None for all the features
+      """
+      positions = None
+      if query is not None:
+         bbox = query.bbox
+         positions = self.data.query_bounds((bbox.minx, bbox.miny,
+                                             bbox.maxx, bbox.maxy))
+      keys = self._attribute_names()
+      features = ((geometry, _mapnik_attributes(attributes))
+                  for geometry, attributes
+                  in self.data.iter_wkb_features(positions))
+      return mapnik.PythonDatasource.wkb_features(keys, features)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:22:05 2026
+
+@author: phunh
+"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from utils.import_cache import replace_file
+
+def file_hash(file_path):
+   """Return the SHA1 of the content of a file
+   :param str file_path: The full path to the file
+   """
+   digest = hashlib.sha1()
+   with open(file_path, 'rb') as input_file:
+      for block in iter(lambda: input_file.read(65536), b''):
+         digest.update(block)
+   return digest.hexdigest()
+
+class TileCache(object):
+   """Cache of rendered tiles with an in-memory LRU tier backed by
+   an optional directory. The keys are (z, x, y, style hash, data hash)
+   so the tiles of a previous style or data are never returned
+   """
+   def __init__(self, cache_dir=None, max_tiles=1024):
+      """
+      :param str cache_dir: Directory of the disk tier, None to keep
+      the tiles only in memory
+      :param int max_tiles: Number of tiles kept in memory
+      """
+      self.cache_dir = cache_dir
+      self.max_tiles = max_tiles
+      self._tiles = OrderedDict()
+      self._lock = threading.Lock()
+      self.hits = 0
+      self.misses = 0
+      self.evictions = 0
+      self.disk_hits = 0
+
+   def _version_dir(self, style_hash, data_hash):
+      return os.path.join(self.cache_dir, '{}-{}'.format(style_hash, data_hash))
+
+   def _tile_path(self, key):
+      z, x, y, style_hash, data_hash = key
+      return os.path.join(self._version_dir(style_hash, data_hash),
+                          str(z), str(x), '{}.png'.format(y))
+
+   def _remember(self, key, data):
+      """Store a tile in memory and evict the least recently used ones
+      """
+      with self._lock:
+         self._tiles.pop(key, None)
+         self._tiles[key] = data
+         while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+            self.evictions += 1
+
+   def get(self, key):
+      """Return the PNG data of a tile or None if it's not cached
+      :param key: (z, x, y, style hash, data hash)
+      """
+      with self._lock:
+         data = self._tiles.pop(key, None)
+         if data is not None:
+            # Move it to the most recently used end
+            self._tiles[key] = data
+            self.hits += 1
+            return data
+      if self.cache_dir:
+         try:
+            with open(self._tile_path(key), 'rb') as tile_file:
+               data = tile_file.read()
+         except IOError:
+            data = None
+         if data is not None:
+            self._remember(key, data)
+            with self._lock:
+               self.hits += 1
+               self.disk_hits += 1
+            return data
+      with self._lock:
+         self.misses += 1
+      return None
+
+   def put(self, key, data):
+      """Store the PNG data of a tile in memory and on disk
+      :param key: (z, x, y, style hash, data hash)
+      :param data: PNG data
+      """
+      self._remember(key, data)
+      if not self.cache_dir:
+         return
+      tile_path = self._tile_path(key)
+      directory = os.path.dirname(tile_path)
+      if not os.path.isdir(directory):
+         try:
+            os.makedirs(directory)
+         except OSError:
+            if not os.path.isdir(directory):
+               raise
+      # Readers never see a partially written tile
+      handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+      try:
+         with os.fdopen(handle, 'wb') as tile_file:
+            tile_file.write(data)
+         replace_file(temp_path, tile_path)
+      except OSError:
+         if os.path.exists(temp_path):
+            os.remove(temp_path)
+         raise
+
+   def remove_other_versions(self, style_hash, data_hash):
+      """Delete the tiles of the other styles and data from the disk
+      :param str style_hash: Hash of the current style file
+      :param str data_hash: Hash of the current data
+      """
+      if not self.cache_dir or not os.path.isdir(self.cache_dir):
+         return
+      current = os.path.basename(self._version_dir(style_hash, data_hash))
+      for name in os.listdir(self.cache_dir):
+         path = os.path.join(self.cache_dir, name)
+         if name != current and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+   def clear(self):
+      """Remove the tiles kept in memory
+      """
+      with self._lock:
+         self._tiles.clear()
+
+   def stats(self):
+      """Return the counters of the cache
+      """
+      with self._lock:
+         return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'disk_hits': self.disk_hits,
+            'tiles_in_memory': len(self._tiles)}
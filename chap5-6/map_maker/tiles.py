@@ -0,0 +1,207 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:41:37 2026
+
+@author: phunh
+"""
+
+import os
+import math
+import multiprocessing
+from multiprocessing import Pool
+import mapnik
+
+TILE_SIZE = 256
+# Half the width of the WebMercator world in meters
+ORIGIN = 20037508.342789244
+# Latitude limit of the WebMercator tiles
+MAX_LATITUDE = 85.0511287798
+MERCATOR_SRS = ('+proj=merc +a=6378137 +b=6378137 +lat_ts=0.0 +lon_0=0.0 '
+                '+x_0=0.0 +y_0=0.0 +k=1.0 +units=m +nadgrids=@null '
+                '+wktext +no_defs +over')
+
+def check_tile(z, x, y):
+   """Raise a ValueError if a tile is outside the world
+   :param int z: Zoom level
+   :param int x: Column of the tile
+   :param int y: Row of the tile, 0 is the north
+   """
+   if z < 0 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+      raise ValueError("The tile is outside the world: {}/{}/{}".format(
+         z, x, y))
+
+def check_metatile(metatile):
+   """Raise a ValueError if the size of the metatiles isn't a power of
+   two, the metatiles wouldn't fit in the tiles of the world
+   :param int metatile: Number of tiles of each side of a metatile
+   """
+   if metatile < 1 or metatile & (metatile - 1):
+      raise ValueError("The metatile size must be a power of two: {}".format(
+         metatile))
+
+def tile_bounds(z, x, y, count=1):
+   """Return the WebMercator bounds of a block of tiles
+   :param int z: Zoom level
+   :param int x: Column of the top left tile
+   :param int y: Row of the top left tile, 0 is the north
+   :param int count: Number of tiles of each side of the block
+   :return: (xmin, ymin, xmax, ymax) in meters
+   """
+   size = 2 * ORIGIN / 2 ** z
+   return (x * size - ORIGIN, ORIGIN - (y + count) * size,
+           (x + count) * size - ORIGIN, ORIGIN - y * size)
+
+def lonlat_to_tile(lon, lat, z):
+   """Return the (x, y) of the tile containing a point
+   :param lon: Longitude in degrees
+   :param lat: Latitude in degrees
+   :param int z: Zoom level
+   """
+   n = 2 ** z
+   lat = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, lat)))
+   x = int((lon + 180.0) / 360.0 * n)
+   y = int((1 - math.log(math.tan(lat) + 1 / math.cos(lat)) / math.pi) / 2 * n)
+   return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tile_range(bounds, z):
+   """Return the (xmin, ymin, xmax, ymax) tiles covering bounds, inclusive
+   :param bounds: (lon min, lat min, lon max, lat max) in degrees
+   :param int z: Zoom level
+   """
+   xmin, ymax = lonlat_to_tile(bounds[0], bounds[1], z)
+   xmax, ymin = lonlat_to_tile(bounds[2], bounds[3], z)
+   return xmin, ymin, xmax, ymax
+
+def iter_metatiles(bounds, zooms, metatile=8):
+   """Yield the metatiles covering bounds at each zoom level.
+   A metatile is a block of metatile x metatile tiles aligned on
+   multiples of metatile, smaller at the zoom levels with fewer tiles
+   :param bounds: (lon min, lat min, lon max, lat max) in degrees
+   :param zooms: Zoom levels
+   :param int metatile: Number of tiles of each side of a metatile,
+   a power of two
+   :return: A generator of (z, x, y, count, tile range) where x and y are
+   the top left tile and the tile range limits the tiles to keep
+   """
+   check_metatile(metatile)
+   for z in zooms:
+      count = min(metatile, 2 ** z)
+      tiles = tile_range(bounds, z)
+      for x in range(tiles[0] - tiles[0] % count, tiles[2] + 1, count):
+         for y in range(tiles[1] - tiles[1] % count, tiles[3] + 1, count):
+            yield z, x, y, count, tiles
+
+class MetatileRenderer(object):
+   """Render metatiles with a single Mapnik map and cut them into tiles.
+   Labels are placed once for the whole metatile so they don't break
+   at the inner tile borders
+   """
+   def __init__(self, map, buffer_size=128):
+      """
+      :param map: A mapnik.Map with the layers and the styles
+      :param int buffer_size: Pixels rendered around the metatile so the
+      labels and symbols near its borders are placed as in its neighbours
+      """
+      self.map = map
+      self.map.srs = MERCATOR_SRS
+      self.map.buffer_size = buffer_size
+
+   def render(self, z, x, y, count=1, tiles=None):
+      """Render a metatile
+      :param int z: Zoom level
+      :param int x: Column of the top left tile
+      :param int y: Row of the top left tile
+      :param int count: Number of tiles of each side of the metatile
+      :param tiles: Optional (xmin, ymin, xmax, ymax) range of tiles to keep
+      :return: A list of ((z, x, y), PNG data)
+      """
+      pixels = count * TILE_SIZE
+      if self.map.width != pixels or self.map.height != pixels:
+         self.map.resize(pixels, pixels)
+      self.map.zoom_to_box(mapnik.Box2d(*tile_bounds(z, x, y, count)))
+      image = mapnik.Image(pixels, pixels)
+      mapnik.render(self.map, image)
+      result = []
+      for tile_x in range(x, x + count):
+         for tile_y in range(y, y + count):
+            if tiles and not (tiles[0] <= tile_x <= tiles[2] and
+                              tiles[1] <= tile_y <= tiles[3]):
+               continue
+            view = image.view((tile_x - x) * TILE_SIZE,
+                              (tile_y - y) * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+            result.append(((z, tile_x, tile_y), view.tostring('png')))
+      return result
+
+def write_tile(output_dir, tile, data):
+   """Write a tile into output_dir/z/x/y.png
+   """
+   z, x, y = tile
+   directory = os.path.join(output_dir, str(z), str(x))
+   if not os.path.isdir(directory):
+      try:
+         os.makedirs(directory)
+      except OSError:
+         # Created by another process
+         if not os.path.isdir(directory):
+            raise
+   with open(os.path.join(directory, '{}.png'.format(y)), 'wb') as tile_file:
+      tile_file.write(data)
+
+def _forks_workers():
+   """Check if the pool workers are forked from this process
+   """
+   try:
+      return multiprocessing.get_start_method() == 'fork'
+   except AttributeError:
+      # Python 2 forks everywhere except on Windows
+      return os.name != 'nt'
+
+# Renderer of the worker processes, set by _init_worker
+_worker_renderer = None
+
+def _init_worker(build_map, buffer_size):
+   global _worker_renderer
+   _worker_renderer = MetatileRenderer(build_map(), buffer_size)
+
+def _render_worker(args):
+   """Render a metatile in a worker process and write its tiles
+   :return: The number of tiles written
+   """
+   output_dir, metatile = args
+   tiles = _worker_renderer.render(*metatile)
+   for tile, data in tiles:
+      write_tile(output_dir, tile, data)
+   return len(tiles)
+
+def render_tiles(build_map, bounds, zooms, output_dir, metatile=8,
+                 buffer_size=128, processes=None):
+   """Render z/x/y PNG tiles covering bounds in a pool of processes.
+   Each worker creates its own map once and renders whole metatiles.
+   The layers are inherited by the workers when they are forked, where
+   the workers can't be forked the tiles are rendered in this process
+   :param build_map: A function without arguments returning a mapnik.Map
+   with the layers and the styles
+   :param bounds: (lon min, lat min, lon max, lat max) in degrees
+   :param zooms: Zoom levels
+   :param str output_dir: Directory of the tiles
+   :param int metatile: Number of tiles of each side of a metatile,
+   a power of two
+   :param int buffer_size: Pixels rendered around each metatile
+   :param int processes: Number of processes, None for the number of CPUs
+   and 1 to render in this process
+   :return: The number of tiles written
+   """
+   metatiles = list(iter_metatiles(bounds, zooms, metatile))
+   tasks = [(output_dir, item) for item in metatiles]
+   if processes == 1 or not _forks_workers():
+      _init_worker(build_map, buffer_size)
+      return sum(_render_worker(task) for task in tasks)
+   pool = Pool(processes, initializer=_init_worker,
+               initargs=(build_map, buffer_size))
+   try:
+      # The metatiles have very different costs, hand them out one by one
+      return sum(pool.imap_unordered(_render_worker, tasks))
+   finally:
+      pool.close()
+      pool.join()
@@ -6,26 +6,46 @@ Created on Sun Apr 21 02:22:08 2019
 @author: phunh
 """
 
+import os
 import cv2
 import mapnik
+import hashlib
 import platform
 import tempfile
 from models import BoundaryCollection, PointCollection
-from map_maker.my_datasource import MapDatasource
+from map_maker.my_datasource import create_datasource, unregister_collection
+from map_maker.tiles import render_tiles, MetatileRenderer
+from map_maker.tiles import check_tile, check_metatile
+from map_maker.tile_cache import TileCache, file_hash
 
 class MapMakerApp(object):
    def __init__(self, output_image="output/map.png",
                 style_file="map_maker/styles.xml",
-                map_size=(800, 600)):
+                map_size=(800, 600), tile_cache_dir=None,
+                tile_cache_size=1024):
       """Application class
       :param output_image: Path to the image output of the map
       :param style_file: Mapnik XML file containing only the style for the map
       :param map_size: Size of the map in pixels
+      :param tile_cache_dir: Optional directory of the rendered tiles
+      :param tile_cache_size: Number of rendered tiles kept in memory
       """
       self.output_image = output_image
       self.style_file = style_file
       self.map_size = map_size
       self._layers = {}
+      self.tile_cache = TileCache(tile_cache_dir, tile_cache_size)
+      self._style_hash = None
+      self._data_hash = None
+      self._renderer = None
+      self._cache_version = None
+      
+   def _use_python_datasource(self):
+      """Check if Mapnik can read the collections in memory.
+      The Python plugin isn't available on Windows
+      """
+      return (platform.system() != "Windows" and
+              'python' in mapnik.DatasourceCache.plugin_names())
       
    def display_map(self):
       """Open and display a map image file
@@ -35,40 +55,156 @@ class MapMakerApp(object):
       cv2.waitKey(0)
       cv2.destroyAllWindows()
       
-   def create_map(self):
-      """Create a map and write it to an image file
+   def _build_map(self, map_size=None):
+      """Create a Mapnik map with the style file and the layers
+      :param map_size: Size of the map in pixels, the size of the app if None
       """
       # a tuple or list is unpacked with the * symbol into an argument of Map
-      map = mapnik.Map(*self.map_size)
+      map = mapnik.Map(*(map_size or self.map_size))
       mapnik.load_map(map, self.style_file)
       layers = map.layers
-      for name, layer in self._layers.iteritems():
+      for name, layer in self._layers.items():
          new_layer = mapnik.Layer(name)
          new_layer.datasource = layer["data_source"]
          new_layer.styles.append(layer['style'])
          layers.append(new_layer)
-         
+      return map
+   
+   def create_map(self):
+      """Create a map and write it to an image file
+      """
+      map = self._build_map()
       map.zoom_all()
       mapnik.render_to_file(map, self.output_image)
       
+   def bounds(self):
+      """Return the bounds of all the layers in degrees or None
+      if the layers have no data
+      """
+      bounds = [layer["data"].bounds() for layer in self._layers.values()]
+      bounds = [item for item in bounds if item]
+      if not bounds:
+         return None
+      xmin, ymin, xmax, ymax = zip(*bounds)
+      return min(xmin), min(ymin), max(xmax), max(ymax)
+   
+   def render_tiles(self, output_dir, zooms, bounds=None, metatile=8,
+                    processes=None):
+      """Render the layers into output_dir/z/x/y.png slippy map tiles
+      :param str output_dir: Directory of the tiles
+      :param zooms: Zoom levels to render
+      :param bounds: (lon min, lat min, lon max, lat max) to render,
+      the bounds of the layers if None
+      :param int metatile: Number of tiles of each side of a metatile,
+      a power of two
+      :param int processes: Number of processes, None for the number of CPUs
+      :return: The number of tiles written
+      """
+      bounds = bounds or self.bounds()
+      if bounds is None:
+         return 0
+      return render_tiles(self._build_map, bounds, zooms, output_dir,
+                          metatile, processes=processes)
+   
+   def style_hash(self):
+      """Return the hash of the style file, read again when the file changes
+      """
+      stat = os.stat(self.style_file)
+      state = (self.style_file, stat.st_mtime, stat.st_size)
+      if self._style_hash is None or self._style_hash[0] != state:
+         self._style_hash = (state, file_hash(self.style_file))
+      return self._style_hash[1]
+   
+   def data_hash(self):
+      """Return the hash of the layers and their data,
+      computed again when the layers or their data change
+      """
+      # The size catches the items appended without calling invalidate
+      state = sorted((name, id(layer["data"]), layer["data"].revision,
+                      len(layer["data"].data), layer["style"])
+                     for name, layer in self._layers.items())
+      if self._data_hash is None or self._data_hash[0] != state:
+         digest = hashlib.sha1()
+         for name, layer in sorted(self._layers.items()):
+            data = layer["data"]
+            digest.update(repr((name, layer["style"], data.epsg)).encode('utf-8'))
+            for geometry, attributes in data.iter_wkb_features():
+               digest.update(geometry)
+               digest.update(repr(sorted(attributes.items())).encode('utf-8'))
+         self._data_hash = (state, digest.hexdigest())
+      return self._data_hash[1]
+   
+   def get_tile(self, z, x, y, metatile=8):
+      """Return the PNG data of a z/x/y tile from the tile cache.
+      On a miss the metatile of the tile is rendered and all its tiles
+      are cached. The tiles of the other styles and data are deleted
+      from the disk when the style or the data change
+      :param int z: Zoom level
+      :param int x: Column of the tile
+      :param int y: Row of the tile, 0 is the north
+      :param int metatile: Number of tiles of each side of a metatile,
+      a power of two
+      """
+      check_tile(z, x, y)
+      check_metatile(metatile)
+      version = (self.style_hash(), self.data_hash())
+      if self._cache_version != version:
+         self.tile_cache.remove_other_versions(*version)
+         self._cache_version = version
+      key = (z, x, y) + version
+      data = self.tile_cache.get(key)
+      if data is not None:
+         return data
+      # The map is created again when the style or the data change
+      if self._renderer is None or self._renderer[0] != version:
+         self._renderer = (version, MetatileRenderer(self._build_map()))
+      count = min(metatile, 2 ** z)
+      tiles = self._renderer[1].render(z, x - x % count, y - y % count, count)
+      for tile, tile_data in tiles:
+         self.tile_cache.put(tile + version, tile_data)
+         if tile == (z, x, y):
+            data = tile_data
+      return data
+      
    def add_layer(self, geo_data, name, style='style1'):
       """Add data to the map to be displayed in a layer with a given style
       :param geo_data: a BaseGeoCollection subclass instance
       """
-      if platform.system() == "Windows":
-         print("Windows system")
-      #else:
-         #data_source = mapnik.Python(factory='MapDatasource', data='geo_data')
-      temp_file, filename = tempfile.mkstemp(dir="temp")
-      geo_data.export_geojson(filename)
-      data_source = mapnik.GeoJSON(file=filename)
-      
+      self.remove_layer(name)
       layer = {
-         "data_source": data_source,
          "data": geo_data,
-         "style": style}
+         "style": style,
+         "key": None,
+         "temp_file": None}
+      if self._use_python_datasource():
+         # The features are read from the collection while rendering
+         layer["data_source"], layer["key"] = create_datasource(geo_data)
+      else:
+         handle, filename = tempfile.mkstemp(dir="temp", suffix='.json')
+         os.close(handle)
+         geo_data.export_geojson(filename, indent=None)
+         layer["data_source"] = mapnik.GeoJSON(file=filename)
+         layer["temp_file"] = filename
       self._layers[name] = layer
       
+   def remove_layer(self, name):
+      """Remove a layer and release its data
+      :param name: The name of the layer
+      """
+      layer = self._layers.pop(name, None)
+      if layer is None:
+         return
+      if layer["key"] is not None:
+         unregister_collection(layer["key"])
+      if layer["temp_file"] is not None and os.path.exists(layer["temp_file"]):
+         os.remove(layer["temp_file"])
+         
+   def close(self):
+      """Remove all the layers
+      """
+      for name in list(self._layers):
+         self.remove_layer(name)
+      
 if __name__ == '__main__':
    shp_file = '../data/world_borders_simple.shp'
    #gpx_src = '../data/geocaching.gpx'
@@ -80,4 +216,5 @@ if __name__ == '__main__':
    map_app = MapMakerApp()
    map_app.add_layer(countries, 'countries')
    map_app.create_map()
+   map_app.close()
    map_app.display_map()
\ No newline at end of file
@@ -8,23 +8,237 @@ Created on Thu Apr 18 18:15:46 2019
 
 from __future__ import print_function
 from shapely.geometry import Point, mapping
+from shapely.prepared import prep
 from shapely import wkb, wkt
+import numpy as np
 import json
-from utils.geo_functions import open_vector_file
+import struct
+import datetime
+import itertools
+from collections import deque
+from multiprocessing import Pool, cpu_count
+try:
+   basestring
+except NameError:
+   basestring = str
+from utils.geo_functions import iter_vector_file, iter_chunks
+from utils.geo_functions import expand_file_paths, get_file_epsg
 from utils.geo_functions import transform_geometry, convert_length_unit
+from utils.geo_functions import convert_area_unit
+from utils.geo_functions import transform_points
+from utils.geometry_arrays import pack_sequences, unpack_coordinates
+from utils.geodesic import geometry_lengths, geometry_areas
+from utils.import_cache import load_features, save_features
+from utils.column_store import save_columns, open_columns
+from utils.spatial_join import spatial_join
+from utils.spatial_index import SpatialIndex, PointIndex, contains_points
+
+def load_geometry(geometry):
+   """Create a shapely geometry from the geometry of a feature
+   :param dict geometry: Geometry with WKB, WKT or [lat, lon] coordinates
+   """
+   coordinates = geometry['coordinates']
+   if geometry.get('format') == 'wkb':
+      return wkb.loads(coordinates)
+   if isinstance(coordinates, basestring):
+      return wkt.loads(coordinates)
+   return Point(float(coordinates[1]), float(coordinates[0]))
+
+def _open_source(file_path, chunk_size=1000, fields=None, cache_dir=None):
+   """Return the chunks of features of a file and its information.
+   The features are read from the import cache when cache_dir is set
+   and the file didn't change since they were cached, otherwise they
+   are cached while they are read
+   """
+   if cache_dir:
+      cached = load_features(cache_dir, file_path, fields)
+      if cached:
+         return cached
+   chunks, metadata = iter_vector_file(file_path, chunk_size, fields=fields)
+   if cache_dir:
+      chunks = save_features(cache_dir, file_path, chunks, metadata, fields)
+   return chunks, metadata
+
+def _read_source(args):
+   """Read all the features of a file in a worker process
+   :param args: (file_path, fields, cache_dir)
+   :return: The file path, the list of features and the information
+   """
+   file_path, fields, cache_dir = args
+   chunks, metadata = _open_source(file_path, fields=fields,
+                                   cache_dir=cache_dir)
+   features = [feature for chunk in chunks for feature in chunk]
+   return file_path, features, metadata
+
+def _imap_window(pool, function, tasks, window):
+   """Yield the results of function over tasks in their order like
+   Pool.imap, but submit a task only when fewer than window tasks are
+   waiting, so the parent holds the results of a few tasks at most
+   :param pool: A multiprocessing Pool
+   :param int window: Number of tasks submitted ahead of the consumer
+   """
+   tasks = iter(tasks)
+   pending = deque(pool.apply_async(function, (task,))
+                   for task in itertools.islice(tasks, window))
+   while pending:
+      result = pending.popleft().get()
+      for task in itertools.islice(tasks, 1):
+         pending.append(pool.apply_async(function, (task,)))
+      yield result
+
+def _merge_epsg(epsg, other_epsg, name):
+   """Return the EPSG code of data merged from two sources
+   and raise a ValueError if the codes don't agree
+   :param epsg: The current code or None if there's no data yet
+   :param other_epsg: The code of the data being added
+   :param name: Name of the data being added for the error message
+   """
+   if epsg is not None and other_epsg != epsg:
+      raise ValueError("The EPSG code of {} is {}, expected {}".format(
+         name, other_epsg, epsg))
+   return other_epsg
+
+def _point_wkb(x, y):
+   """Return the little endian WKB of a point
+   """
+   return struct.pack('<BIdd', 1, 1, x, y)
+
+def _fold_case(value):
+   """Return strings in lower case and any other value unchanged
+   """
+   if isinstance(value, basestring):
+      return value.lower()
+   return value
+
+def _json_default(value):
+   """Serialize the attribute values that json doesn't support
+   """
+   if isinstance(value, (datetime.date, datetime.time)):
+      return value.isoformat()
+   raise TypeError("{!r} is not JSON serializable".format(value))
+
+def _dump_feature(feature, indent=None):
+   if indent is None:
+      return json.dumps(feature, separators=(',', ':'), default=_json_default)
+   return json.dumps(feature, indent=indent, separators=(',', ': '),
+                     default=_json_default)
+
+def write_feature_collection(out_file, features, indent=None):
+   """Write features into a file as a GeoJSON FeatureCollection
+   without keeping them in memory
+   :param out_file: A file opened for writing
+   :param features: An iterable of GeoJSON features
+   :param indent: Number of spaces of indentation, None for compact output
+   """
+   if indent is None:
+      out_file.write('{"type":"FeatureCollection","features":[')
+      for index, feature in enumerate(features):
+         if index:
+            out_file.write(',')
+         out_file.write(_dump_feature(feature))
+      out_file.write(']}')
+      return
+   space = ' ' * indent
+   out_file.write('{{\n{0}"type": "FeatureCollection",\n'
+                  '{0}"features": ['.format(space))
+   index = -1
+   for index, feature in enumerate(features):
+      if index:
+         out_file.write(',')
+      lines = _dump_feature(feature, indent).split('\n')
+      out_file.write('\n' + '\n'.join(space * 2 + line for line in lines))
+   if index >= 0:
+      out_file.write('\n' + space)
+   out_file.write(']\n}')
+
+def write_geojson_seq(out_file, features):
+   """Write features into a file as newline delimited GeoJSON (GeoJSONSeq),
+   one compact feature per line
+   :param out_file: A file opened for writing
+   :param features: An iterable of GeoJSON features
+   """
+   for feature in features:
+      out_file.write(_dump_feature(feature))
+      out_file.write('\n')
+
+class AttributesView(dict):
+   """Read-only dictionary of the attributes of an object.
+   Changing it raises a TypeError, assign a new dictionary
+   to the attributes of the object instead
+   """
+   def _read_only(self, *args, **kwargs):
+      raise TypeError("The attributes are read-only, assign a new "
+                      "dictionary to the attributes of the object")
+   
+   __setitem__ = __delitem__ = _read_only
+   update = setdefault = pop = popitem = clear = __ior__ = _read_only
+   
+   def __reduce__(self):
+      # Copies and pickles are ordinary dictionaries
+      return dict, (dict(self),)
+
+class AttributeSchema(object):
+   """The attribute names shared by the objects of a collection
+   with a lookup table of case insensitive names
+   """
+   __slots__ = ('keys', 'positions', 'lowercase')
+   
+   def __init__(self, keys):
+      """
+      :param keys: The attribute names in the order of the values
+      """
+      self.keys = tuple(keys)
+      self.positions = dict((key, index) for index, key in enumerate(self.keys))
+      self.lowercase = {}
+      for key in self.keys:
+         self.lowercase[key.lower()] = key
+         
+   def values(self, attributes):
+      """Return the values of an attributes dictionary as a tuple
+      in the order of the schema
+      """
+      return tuple(attributes[key] for key in self.keys)
 
 class BaseGeoObject(object):
-   """Base class for a single geo object
+   """Base class for a single geo object.
+   The attribute values are stored in a tuple and their names
+   in a schema that can be shared by many objects
    """
-   def __init__(self, geometry, attributes=None):
+   __slots__ = ('geom', 'wm_geom', '_schema', '_values')
+   # Incremented each time the attributes of an object are replaced,
+   # the objects don't know their collections so all the collections
+   # build their attribute indexes again
+   attribute_changes = 0
+   
+   def __init__(self, geometry, attributes=None, schema=None):
+      """
+      :param geometry: A shapely geometry
+      :param dict attributes: The attributes of the object
+      :param schema: Optional AttributeSchema with the same keys as attributes
+      """
       self.geom = geometry
-      self.attributes = attributes
       self.wm_geom = None
+      self._set_attributes(attributes or {}, schema)
+      
+   def _set_attributes(self, attributes, schema=None):
+      if schema is None:
+         schema = AttributeSchema(attributes)
+      self._schema = schema
+      self._values = schema.values(attributes)
       
-      #Make a lookup table of case insensitive attributes
-      self._attributes_lowercase = {}
-      for key in self.attributes.keys():
-         self._attributes_lowercase[key.lower()] = key
+   @property
+   def attributes(self):
+      """A read-only dictionary with the attributes of the object.
+      Changing it in place raises a TypeError, assign a new dictionary
+      to change the attributes, for example
+      item.attributes = dict(item.attributes, name='New name')
+      """
+      return AttributesView(zip(self._schema.keys, self._values))
+   
+   @attributes.setter
+   def attributes(self, attributes):
+      self._set_attributes(attributes)
+      BaseGeoObject.attribute_changes += 1
       
    def __repr__(self):
       raise NotImplementedError
@@ -48,8 +262,8 @@ class BaseGeoObject(object):
       """
       if not case_sensitive:
          attr_name = attr_name.lower()
-         attr_name = self._attributes_lowercase[attr_name]
-      return self.attributes[attr_name]
+         attr_name = self._schema.lowercase[attr_name]
+      return self._values[self._schema.positions[attr_name]]
    
    def export_geojson_feature(self):
       """Export this object as dictionary formatted as a GeoJSON feature
@@ -63,22 +277,29 @@ class BaseGeoObject(object):
 class Geocache(BaseGeoObject):
    """This class represents a single geocaching point
    """
-   def __init__(self, geometry, attributes=None):
-      super(Geocache, self).__init__(geometry, attributes)
+   __slots__ = ()
+   
+   def __init__(self, geometry, attributes=None, schema=None):
+      super(Geocache, self).__init__(geometry, attributes, schema)
       
    def __repr__(self):
-      name = self.attributes.get('name', 'Unnamed')
+      try:
+         name = self.get_attribute('name', case_sensitive=True)
+      except KeyError:
+         name = 'Unnamed'
       return "{} {} - {}".format(self.geom.x, self.geom.y, name)
    
 class LineString(BaseGeoObject):
    """This class represents a single linestring
    """
+   __slots__ = ()
+   
    def length(self, unit='km'):
       """Convenience method that returns the length
-      of the linestring in a given unit
+      of the linestring in a given unit, measured on the WGS84 ellipsoid
       :param unit: The desired output unit
       """
-      return convert_length_unit(self.transformed_geom().length, unit)
+      return convert_length_unit(float(geometry_lengths([self.geom])[0]), unit)
       
    def __repr__(self):
       unit = 'km'
@@ -87,79 +308,382 @@ class LineString(BaseGeoObject):
    
 class Boundary(BaseGeoObject):
    """Represent a single geographic Boundary"""
+   __slots__ = ('_prepared_geom',)
+   
+   def __init__(self, geometry, attributes=None, schema=None):
+      super(Boundary, self).__init__(geometry, attributes, schema)
+      self._prepared_geom = None
+      
    def __repr__(self):
       return self.get_attribute('name')
    
+   def area(self, unit='km2'):
+      """Area of the boundary on the WGS84 ellipsoid in a given unit
+      :param unit: The desired output unit
+      """
+      return convert_area_unit(float(geometry_areas([self.geom])[0]), unit)
+   
+   def perimeter(self, unit='km'):
+      """Perimeter of the boundary on the WGS84 ellipsoid in a given unit
+      :param unit: The desired output unit
+      """
+      return convert_length_unit(float(geometry_lengths([self.geom])[0]), unit)
+   
+   @property
+   def prepared_geom(self):
+      """The prepared geometry of the boundary, created once and cached
+      """
+      if self._prepared_geom is None:
+         self._prepared_geom = prep(self.geom)
+      return self._prepared_geom
+   
 class BaseGeoCollection(object):
    """This class represents a collection of spatial data
    """
-   def __init__(self, file_path=None):
+   def __init__(self, file_path=None, fields=None, cache_dir=None):
+      """
+      :param str file_path: Optional file to import
+      :param fields: Names of the attributes to import or None for all of them
+      :param str cache_dir: Optional directory of the import cache
+      """
+      # Incremented each time the data changes, changes made in place
+      # in the data list must be followed by a call to invalidate
+      self.revision = 0
+      self._invalidate_indexes()
+      # Attribute schemas shared by the objects, by attribute names
+      self._schemas = {}
       self.data = []
       self.epsg = None
       
       if file_path:
-         self.import_data(file_path)
+         self.import_data(file_path, fields=fields, cache_dir=cache_dir)
          
+   @property
+   def data(self):
+      """The list of objects. Assigning a list marks the data as changed,
+      call invalidate after changing the list in place
+      """
+      return self._data
+   
+   @data.setter
+   def data(self, items):
+      self._data = items
+      self._invalidate_indexes()
+      
    def __add__(self, other):
-      self.data += other.data
+      self.epsg = self._combined_epsg(other)
+      self.data = self.data + list(other.data)
       return self
    
+   def _current_epsg(self):
+      """Return the EPSG code of the data or None if there's no data
+      """
+      return self.epsg if len(self.data) else None
+   
+   def _combined_epsg(self, other):
+      """Return the EPSG code of this collection merged with another one
+      """
+      if not len(other.data):
+         return self.epsg
+      return _merge_epsg(self._current_epsg(), other.epsg, "the collection")
+   
+   def _get_schema(self, attributes):
+      """Return the schema shared by the objects with these attribute names
+      :param attributes: A dictionary or a sequence of attribute names
+      """
+      keys = tuple(attributes)
+      schema = self._schemas.get(keys)
+      if schema is None:
+         schema = self._schemas[keys] = AttributeSchema(keys)
+      return schema
+   
+   def invalidate(self):
+      """Mark the data as changed after it was modified in place,
+      for example with data.append, so the indexes are built again
+      """
+      self._invalidate_indexes()
+      
+   def _invalidate_indexes(self):
+      """Discard the indexes built for the current data
+      """
+      self.revision += 1
+      self._spatial_index = None
+      self._attribute_indexes = {}
+      self._attribute_state = None
+      
+   def _create_spatial_index(self):
+      return SpatialIndex(item.geom for item in self.data)
+   
+   @property
+   def spatial_index(self):
+      """Spatial index of the data, built on first use and reused
+      until the data changes or items are appended
+      """
+      # The size catches the items appended without calling invalidate
+      state = (self.revision, len(self.data))
+      if self._spatial_index is None or self._spatial_index[0] != state:
+         self._spatial_index = (state, self._create_spatial_index())
+      return self._spatial_index[1]
+   
+   def transform_all(self):
+      """Transform all the geometries into WorldMercator with a single
+      call and store the results in the objects, so that
+      BaseGeoObject.transformed_geom doesn't transform them one by one
+      """
+      items = list(self.data)
+      geometries = [item.geom for item in items]
+      transformed = transform_points(pack_sequences(geometries)['coordinates'])
+      for item, geom in zip(items, unpack_coordinates(geometries,
+                                                       transformed)):
+         item.wm_geom = geom
+   
+   def query_bounds(self, bounds):
+      """Return the sorted positions of the items whose bounding box
+      intersects the given bounds
+      :param bounds: (xmin, ymin, xmax, ymax)
+      """
+      return self.spatial_index.query(bounds)
+   
    def _parse_data(self, features):
       """Transform the data into BaseGeoObject objects
-      :param features: A list of features
+      :param features: A list of features, it can be called
+      several times with consecutive chunks of features
       """
       raise NotImplementedError
          
-   def import_data(self, file_path):
-      """Open a vector file compatible with OGR and parse the data
+   def import_data(self, file_path, chunk_size=1000, fields=None,
+                   cache_dir=None):
+      """Open a vector file compatible with OGR and parse the data.
+      The features are parsed in chunks while the file is being read
+      and the OGR fields are imported with their native types
       :param str file_path: The full path to the file
+      :param int chunk_size: Number of features parsed at a time
+      :param fields: Names of the attributes to import or None for all of them
+      :param str cache_dir: Optional directory of the import cache. The
+      features are read from the cache if the file didn't change since
+      they were cached, otherwise they are cached while they are parsed
+      """
+      chunks, metadata = _open_source(file_path, chunk_size, fields, cache_dir)
+      self._import_sources([(file_path, chunks, metadata)])
+      
+   def import_files(self, file_paths, processes=None, chunk_size=1000,
+                    fields=None, cache_dir=None):
+      """Import many files into the collection in parallel.
+      The files are read in a pool of processes and the features of
+      each file are parsed as soon as it's read, in the order of the
+      files. A file is sent to the pool only when fewer files than
+      processes are read or waiting to be parsed, so the features of
+      a few files at most are held at once. Nothing is imported if the EPSG codes of the files don't
+      agree with each other or with the data already in the collection
+      :param file_paths: A list of files and directories, the vector
+      files of the directories are imported
+      :param int processes: Number of processes, None for the number of CPUs
+      :param int chunk_size: Number of features parsed at a time
+      :param fields: Names of the attributes to import or None for all of them
+      :param str cache_dir: Optional directory of the import cache
       """
-      features, metadata = open_vector_file(file_path)
-      self._parse_data(features)
-      self.epsg = metadata['epsg']
-      print("File imported: {}".format(file_path))
+      file_paths = expand_file_paths(file_paths)
+      # The EPSG codes are read from the files before importing any of them
+      epsg = self._current_epsg()
+      for file_path in file_paths:
+         epsg = _merge_epsg(epsg, get_file_epsg(file_path), file_path)
+      if len(file_paths) < 2 or processes == 1:
+         self._import_sources(
+            (file_path,) + _open_source(file_path, chunk_size, fields,
+                                        cache_dir)
+            for file_path in file_paths)
+         return
+      processes = processes or cpu_count()
+      pool = Pool(processes)
+      try:
+         results = _imap_window(pool, _read_source,
+                                ((file_path, fields, cache_dir)
+                                 for file_path in file_paths), processes)
+         self._import_sources((file_path, iter_chunks(features, chunk_size),
+                               metadata)
+                              for file_path, features, metadata in results)
+      finally:
+         pool.terminate()
+         pool.join()
+      
+   def _import_sources(self, sources):
+      """Parse the features of several files.
+      A ValueError is raised before a file is parsed if its EPSG code
+      doesn't agree with the data already imported
+      :param sources: An iterable of (file_path, chunks, metadata)
+      """
+      epsg = self._current_epsg()
+      try:
+         for file_path, chunks, metadata in sources:
+            epsg = self.epsg = _merge_epsg(epsg, metadata['epsg'], file_path)
+            for features in chunks:
+               self._parse_data(features)
+            print("File imported: {}".format(file_path))
+      finally:
+         # The objects are appended to the data in place
+         self._invalidate_indexes()
       
    def describe(self):
       print("SRS EPSG code: {}".format(self.epsg))
       print("Number of features: {}".format(len(self.data)))
+      
+   def attribute_names(self):
+      """Return the names of the attributes of the items
+      in the order they are first found
+      """
+      names = []
+      schemas = set()
+      for item in self.data:
+         if id(item._schema) in schemas:
+            continue
+         schemas.add(id(item._schema))
+         for key in item._schema.keys:
+            if key not in names:
+               names.append(key)
+      return names
+   
+   def bounds(self):
+      """Return the (xmin, ymin, xmax, ymax) bounds of the data
+      or None if there's no data
+      """
+      bounds = np.array([item.geom.bounds for item in self.data
+                         if not item.geom.is_empty], dtype=np.float64)
+      if not len(bounds):
+         return None
+      return (float(bounds[:, 0].min()), float(bounds[:, 1].min()),
+              float(bounds[:, 2].max()), float(bounds[:, 3].max()))
+   
+   def iter_wkb_features(self, positions=None):
+      """Yield (WKB geometry, attributes) for each item
+      :param positions: Optional positions of the items, all of them if None
+      """
+      if positions is None:
+         positions = range(len(self.data))
+      for position in positions:
+         item = self.data[position]
+         yield item.geom.wkb, item.attributes
+   
+   def _attribute_values(self, attribute):
+      """Yield (position, value) for the items having an attribute
+      :param attribute: The name of the attribute, case insensitive
+      """
+      for position, item in enumerate(self.data):
+         try:
+            yield position, item.get_attribute(attribute)
+         except KeyError:
+            continue
+         
+   def _get_attribute_index(self, attribute, case_sensitive=True):
+      """Return a dictionary mapping each value of an attribute to the
+      positions of the items with that value. It's built on first use
+      and reused until the data changes, items are appended or the
+      attributes of an object are replaced
+      :param attribute: The name of the attribute, case insensitive
+      :param case_sensitive: False to index string values in lower case
+      """
+      # The size catches the items appended without calling invalidate
+      state = (self.revision, len(self.data), BaseGeoObject.attribute_changes)
+      if self._attribute_state != state:
+         self._attribute_indexes = {}
+         self._attribute_state = state
+      key = (attribute.lower(), case_sensitive)
+      if key not in self._attribute_indexes:
+         index = {}
+         for position, value in self._attribute_values(attribute):
+            if not case_sensitive:
+               value = _fold_case(value)
+            try:
+               index.setdefault(value, []).append(position)
+            except TypeError:
+               # Unhashable values can't be looked up
+               continue
+         self._attribute_indexes[key] = index
+      return self._attribute_indexes[key]
+   
+   def _lookup(self, attribute, value, case_sensitive=True):
+      """Return the positions of the items whose attribute equals value
+      """
+      if not case_sensitive:
+         value = _fold_case(value)
+      try:
+         hash(value)
+      except TypeError:
+         return [position for position, item_value
+                 in self._attribute_values(attribute)
+                 if (item_value if case_sensitive
+                     else _fold_case(item_value)) == value]
+      index = self._get_attribute_index(attribute, case_sensitive)
+      return index.get(value, [])
+   
+   def _take(self, positions):
+      """Return a new collection with the items at the given positions
+      """
+      result = self.__class__()
+      result.data = [self.data[position] for position in positions]
+      result.epsg = self.epsg
+      return result
    
-   def get_by_name(self, name):
+   def get_by_name(self, name, case_sensitive=True):
       """Find an object by its name attribute and return it
+      :param name: The name to look for
+      :param case_sensitive: False to ignore the case of the name
       """
-      for item in self.data:
-         if item.get_attribute('name') == name:
-            return item
-      raise LookupError("Object not found with the name: {}".format(name))
+      positions = self._lookup('name', name, case_sensitive)
+      if not positions:
+         raise LookupError("Object not found with the name: {}".format(name))
+      return self.data[positions[0]]
       
-   def filter_by_boundary(self, boundary):
+   def _within(self, boundary, positions):
+      """Test which items are inside a boundary
+      :param boundary: A Boundary object
+      :param positions: Positions of the items to test
+      :return: A boolean array
+      """
+      prepared = boundary.prepared_geom
+      return np.array([prepared.contains(self.data[index].geom)
+                       for index in positions], dtype=bool)
+   
+   def filter_by_boundary(self, boundary, use_index=True):
       """Filter the data by a given boundary
+      :param boundary: A Boundary object
+      :param bool use_index: True to test only the items whose bounding box
+      intersects the boundary bounding box, False to test all the items
       """
-      result = []
-      for item in self.data:
-         if item.geom.within(boundary.geom):
-            result.append(item)
-      return result
+      if use_index:
+         candidates = self.query_bounds(boundary.geom.bounds)
+      else:
+         candidates = np.arange(len(self.data))
+      inside = self._within(boundary, candidates)
+      return [self.data[index] for index in candidates[inside]]
    
-   def filter(self, attribute, value):
+   def filter(self, attribute, value, case_sensitive=True):
       """Filter the collection by an attribute
       :param attribute: The name of the attribute to filter by
       :param value: The filtering value
+      :param case_sensitive: False to ignore the case of string values
+      """
+      return self._take(self._lookup(attribute, value, case_sensitive))
+   
+   def _iter_geojson_features(self):
+      """Yield the items of the collection as GeoJSON features
       """
-      result = self.__class__()
       for item in self.data:
-         if item.get_attribute(attribute) == value:
-            result.data.append(item)
-      return result
+         yield item.export_geojson_feature()
    
-   def export_geojson(self, file):
-      """Export the collection to a GeoJSON file
+   def export_geojson(self, file, indent=2, newline_delimited=False):
+      """Export the collection to a GeoJSON file.
+      The features are written one at a time as they are created
+      :param file: Path of the output file
+      :param indent: Number of spaces of indentation, None for compact output
+      :param bool newline_delimited: True to write one compact feature per
+      line (GeoJSONSeq) instead of a FeatureCollection
       """
-      features = [i.export_geojson_feature() for i in self.data]
-      geojson = {
-         "type": "FeatureCollection",
-         "features": features}
+      features = self._iter_geojson_features()
       with open(file, 'w') as out_file:
-         json.dump(geojson, out_file, indent=2)
+         if newline_delimited:
+            write_geojson_seq(out_file, features)
+         else:
+            write_feature_collection(out_file, features, indent)
       print("File exported: {}".format(file))
       
 class PointCollection(BaseGeoCollection):
@@ -170,36 +694,398 @@ class PointCollection(BaseGeoCollection):
       :param features: A list of features
       """
       for feature in features:
-         coords = feature['geometry']['coordinates']
-         point = Point(float(coords[1]), float(coords[0]))
+         point = load_geometry(feature['geometry'])
          attributes = feature['properties']
-         cache_point = Geocache(point, attributes = attributes)
+         cache_point = Geocache(point, attributes=attributes,
+                                schema=self._get_schema(attributes))
          self.data.append(cache_point)
          
+   def coordinates(self):
+      """Return an (N, 2) array with the coordinates of the points
+      """
+      return np.array([(item.geom.x, item.geom.y) for item in self.data],
+                      dtype=np.float64).reshape(-1, 2)
+   
+   def projected_coordinates(self):
+      """Return an (N, 2) array with the WorldMercator coordinates
+      of the points, transforming them if needed
+      """
+      if any(item.wm_geom is None for item in self.data):
+         self.transform_all()
+      return np.array([(item.wm_geom.x, item.wm_geom.y)
+                       for item in self.data], dtype=np.float64).reshape(-1, 2)
+      
+   def _within(self, boundary, positions):
+      """Test which points are inside a boundary with a single call
+      """
+      points = [self.data[index].geom for index in positions]
+      x = np.array([point.x for point in points], dtype=np.float64)
+      y = np.array([point.y for point in points], dtype=np.float64)
+      return contains_points(boundary.prepared_geom, x, y)
+   
+   def spatial_join(self, boundaries, processes=None, chunk_size=100000):
+      """Find the boundary containing each point in a single pass
+      over the points instead of one filter_by_boundary per boundary
+      :param boundaries: A BoundaryCollection
+      :param int processes: Number of processes, None for the number of CPUs
+      and 1 to join in this process
+      :param int chunk_size: Number of points joined at a time
+      :return: An array with the position of the boundary containing each
+      point or -1 and an array with the number of points in each boundary
+      """
+      if len(boundaries.data):
+         _merge_epsg(self._current_epsg(), boundaries.epsg, "the boundaries")
+      coordinates = self.coordinates()
+      return spatial_join(coordinates[:, 0], coordinates[:, 1],
+                          [boundary.geom for boundary in boundaries.data],
+                          processes, chunk_size)
+         
+def _object_array(values):
+   """Create a NumPy object array without unpacking nested sequences
+   """
+   array = np.empty(len(values), dtype=object)
+   for index, value in enumerate(values):
+      array[index] = value
+   return array
+
+def _to_column(values):
+   """Convert a list of attribute values into a column array.
+   Numbers are stored in a numeric array, other values in an object array
+   """
+   if values and all(isinstance(value, (int, float)) and
+                     not isinstance(value, bool) for value in values):
+      return np.array(values)
+   return _object_array(values)
+
+def _merge_columns(parts):
+   """Concatenate the columns of several (x, y, columns) parts.
+   Missing attributes are filled with None
+   :param parts: A list of (x, y, columns) tuples
+   """
+   names = []
+   for x, y, columns in parts:
+      for name in columns:
+         if name not in names:
+            names.append(name)
+   merged = {}
+   for name in names:
+      arrays = []
+      for x, y, columns in parts:
+         if name in columns:
+            arrays.append(columns[name])
+         else:
+            arrays.append(_object_array([None] * len(x)))
+      merged[name] = np.concatenate(arrays) if arrays else _object_array([])
+   x = np.concatenate([part[0] for part in parts] or [np.empty(0)])
+   y = np.concatenate([part[1] for part in parts] or [np.empty(0)])
+   return x, y, merged
+
+def _build_columns(rows):
+   """Convert (x, y, attributes) rows into (x, y, columns).
+   Attributes missing in a row are filled with None
+   :param rows: An iterable of (x, y, attributes dict)
+   """
+   x = []
+   y = []
+   values = {}
+   for index, (row_x, row_y, attributes) in enumerate(rows):
+      x.append(row_x)
+      y.append(row_y)
+      for key, value in attributes.items():
+         values.setdefault(key, [None] * index).append(value)
+      for column in values.values():
+         if len(column) <= index:
+            column.append(None)
+   columns = dict((key, _to_column(column)) for key, column in values.items())
+   return (np.array(x, dtype=np.float64), np.array(y, dtype=np.float64),
+           columns)
+
+def _columns_from_items(items):
+   """Convert Geocache objects into (x, y, columns)
+   """
+   return _build_columns((item.geom.x, item.geom.y, item.attributes)
+                         for item in items)
+
+def _column_value(column, index):
+   """Return a column value as a Python object
+   """
+   value = column[index]
+   if isinstance(value, np.generic):
+      return value.item()
+   return value
+
+class _LazyGeocaches(object):
+   """Sequence of the Geocache objects of a ColumnarPointCollection.
+   The objects are created only when they are accessed
+   """
+   def __init__(self, collection):
+      self._collection = collection
+      
+   def __len__(self):
+      return len(self._collection.x)
+   
+   def __getitem__(self, index):
+      if isinstance(index, slice):
+         return [self[i] for i in range(*index.indices(len(self)))]
+      return self._collection._create_item(index)
+   
+   def __iter__(self):
+      for index in range(len(self)):
+         yield self._collection._create_item(index)
+
+class ColumnarPointCollection(PointCollection):
+   """This class represents a group of points stored in columns.
+   The coordinates are kept in NumPy float64 arrays and each attribute
+   in its own array. Geocache objects are created when they are accessed
+   """
+   def __init__(self, file_path=None, fields=None, cache_dir=None):
+      """
+      :param str file_path: Optional file to import
+      :param fields: Names of the attributes to import or None for all of them
+      :param str cache_dir: Optional directory of the import cache
+      """
+      self._parts = []
+      super(ColumnarPointCollection, self).__init__(file_path, fields,
+                                                    cache_dir)
+      
+   @property
+   def data(self):
+      return _LazyGeocaches(self)
+   
+   @data.setter
+   def data(self, items):
+      self._set_columns(*_columns_from_items(list(items)))
+      
+   def _set_columns(self, x, y, columns):
+      self._invalidate_indexes()
+      self.x = x
+      self.y = y
+      self.columns = columns
+      self.wm_x = None
+      self.wm_y = None
+      #Make a lookup table of case insensitive column names
+      self._columns_lowercase = {}
+      for key in columns.keys():
+         self._columns_lowercase[key.lower()] = key
+         
+   def __add__(self, other):
+      self.epsg = self._combined_epsg(other)
+      if isinstance(other, ColumnarPointCollection):
+         other_columns = (other.x, other.y, other.columns)
+      else:
+         other_columns = _columns_from_items(other.data)
+      parts = [(self.x, self.y, self.columns), other_columns]
+      self._set_columns(*_merge_columns(parts))
+      return self
+   
+   def _parse_data(self, features):
+      """Transform the data into columns
+      :param features: A list of features
+      """
+      points = ((load_geometry(feature['geometry']), feature['properties'])
+                for feature in features)
+      self._parts.append(_build_columns((point.x, point.y, attributes)
+                                        for point, attributes in points))
+      
+   def _import_sources(self, sources):
+      """Parse the features of several files into columns
+      """
+      self._parts = [(self.x, self.y, self.columns)]
+      try:
+         super(ColumnarPointCollection, self)._import_sources(sources)
+         self._set_columns(*_merge_columns(self._parts))
+      finally:
+         self._parts = []
+         
+   def save(self, directory):
+      """Write the collection into flat files that can be opened
+      with ColumnarPointCollection.open
+      :param str directory: The directory of the store
+      """
+      save_columns(directory, self.x, self.y, self.columns, self.epsg)
+      
+   @classmethod
+   def open(cls, directory):
+      """Open a collection written by save without loading it.
+      The columns are read-only memory maps of the files so the
+      processes that open the same store share one copy of the data
+      :param str directory: The directory of the store
+      """
+      x, y, columns, epsg = open_columns(directory)
+      collection = cls()
+      collection._set_columns(x, y, columns)
+      collection.epsg = epsg
+      return collection
+   
+   def _create_item(self, index):
+      """Create the Geocache object of a row
+      """
+      attributes = dict((key, _column_value(column, index))
+                        for key, column in self.columns.items())
+      point = Point(self.x[index], self.y[index])
+      geocache = Geocache(point, attributes=attributes,
+                          schema=self._get_schema(self.columns))
+      if self.wm_x is not None:
+         geocache.wm_geom = Point(self.wm_x[index], self.wm_y[index])
+      return geocache
+   
+   def transform_all(self):
+      """Transform all the coordinates into WorldMercator with a single
+      call and store them in the wm_x and wm_y arrays
+      """
+      transformed = transform_points(np.column_stack([self.x, self.y]))
+      self.wm_x = transformed[:, 0]
+      self.wm_y = transformed[:, 1]
+      
+   def coordinates(self):
+      """Return an (N, 2) array with the coordinates of the points
+      """
+      return np.column_stack([self.x, self.y])
+   
+   def projected_coordinates(self):
+      """Return an (N, 2) array with the WorldMercator coordinates
+      of the points, transforming them if needed
+      """
+      if self.wm_x is None:
+         self.transform_all()
+      return np.column_stack([self.wm_x, self.wm_y])
+   
+   def _take(self, indices):
+      """Return a new collection with the rows at the given indices
+      """
+      result = self.__class__()
+      result._set_columns(self.x[indices], self.y[indices],
+                          dict((key, column[indices])
+                               for key, column in self.columns.items()))
+      if self.wm_x is not None:
+         result.wm_x = self.wm_x[indices]
+         result.wm_y = self.wm_y[indices]
+      result.epsg = self.epsg
+      return result
+   
+   def get_column(self, attribute, case_sensitive=False):
+      """Get the array of an attribute by its name
+      :param attribute: The name of the attribute
+      :param case_sensitive: True or False
+      """
+      if not case_sensitive:
+         attribute = self._columns_lowercase[attribute.lower()]
+      return self.columns[attribute]
+   
+   def _attribute_values(self, attribute):
+      """Yield (position, value) for an attribute column
+      """
+      try:
+         column = self.get_column(attribute)
+      except KeyError:
+         return
+      for position in range(len(column)):
+         yield position, _column_value(column, position)
+         
+   def _create_spatial_index(self):
+      return PointIndex(self.x, self.y)
+   
+   def _within(self, boundary, positions):
+      """Test which points are inside a boundary with a single call
+      """
+      return contains_points(boundary.prepared_geom, self.x[positions],
+                             self.y[positions])
+   
+   def attribute_names(self):
+      """Return the names of the attribute columns
+      """
+      return list(self.columns)
+   
+   def bounds(self):
+      """Return the (xmin, ymin, xmax, ymax) bounds of the points
+      or None if there are no points
+      """
+      if not len(self.x):
+         return None
+      return (float(self.x.min()), float(self.y.min()),
+              float(self.x.max()), float(self.y.max()))
+   
+   def iter_wkb_features(self, positions=None):
+      """Yield (WKB geometry, attributes) for each row
+      without creating Geocache objects
+      :param positions: Optional positions of the rows, all of them if None
+      """
+      items = list(self.columns.items())
+      if positions is None:
+         positions = range(len(self.x))
+      for index in positions:
+         properties = dict((key, _column_value(column, index))
+                           for key, column in items)
+         yield _point_wkb(self.x[index], self.y[index]), properties
+         
+   def _iter_geojson_features(self):
+      """Yield the rows of the collection as GeoJSON features
+      """
+      items = list(self.columns.items())
+      for index in range(len(self.x)):
+         properties = dict((key, _column_value(column, index))
+                           for key, column in items)
+         yield {
+            "type": "Feature",
+            "geometry": {
+               "type": "Point",
+               "coordinates": (float(self.x[index]), float(self.y[index]))},
+            "properties": properties}
+
 class LineStringCollection(BaseGeoCollection):
    """This class represents a collection of linestrings
    """
+   def lengths(self, unit='km', method='vincenty'):
+      """Length of every linestring on the WGS84 ellipsoid, computed
+      for the whole collection at once
+      :param unit: The desired output unit
+      :param str method: 'haversine' (sphere) or 'vincenty' (ellipsoid)
+      :return: An array of lengths in the same order as the data
+      """
+      lengths = geometry_lengths([item.geom for item in self.data], method)
+      return convert_length_unit(lengths, unit)
+   
    def _parse_data(self, features):
       for feature in features:
-         geom = feature['geometry']['coordinates']
          attributes = feature['properties']
-         line = wkt.loads(geom)
-         linestring = LineString(geometry=line, attributes=attributes)
+         line = load_geometry(feature['geometry'])
+         linestring = LineString(geometry=line, attributes=attributes,
+                                 schema=self._get_schema(attributes))
          self.data.append(linestring)
          
 class BoundaryCollection(BaseGeoCollection):
    """This class represents a collection of geographic boundaries
    """
+   def areas(self, unit='km2'):
+      """Area of every boundary on the WGS84 ellipsoid, computed
+      for the whole collection at once
+      :param unit: The desired output unit
+      :return: An array of areas in the same order as the data
+      """
+      areas = geometry_areas([item.geom for item in self.data])
+      return convert_area_unit(areas, unit)
+   
+   def perimeters(self, unit='km', method='vincenty'):
+      """Perimeter of every boundary on the WGS84 ellipsoid, computed
+      for the whole collection at once
+      :param unit: The desired output unit
+      :param str method: 'haversine' (sphere) or 'vincenty' (ellipsoid)
+      :return: An array of perimeters in the same order as the data
+      """
+      lengths = geometry_lengths([item.geom for item in self.data], method)
+      return convert_length_unit(lengths, unit)
+   
    def _parse_data(self, features):
       for feature in features:
-         geom = feature['geometry']['coordinates']
          attributes = feature['properties']
-         polygon = wkt.loads(geom)
-         boundary = Boundary(geometry=polygon, attributes=attributes)
+         polygon = load_geometry(feature['geometry'])
+         boundary = Boundary(geometry=polygon, attributes=attributes,
+                             schema=self._get_schema(attributes))
          self.data.append(boundary)
          
 if __name__ == "__main__":
-   gpx_data = PointCollection("../data/geocaching.gpx")
+   gpx_data = PointCollection("../data/geocaching.gpx",
+                              cache_dir="../data/cache")
    gpx_data.describe()
 #   shp_data = PointCollection("../data/geocaching.shp")
 #   shp_data.describe()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:03:26 2026
+
+@author: phunh
+"""
+
+import os
+import json
+import shutil
+import datetime
+import tempfile
+import numpy as np
+try:
+   basestring
+except NameError:
+   basestring = str
+
+SCHEMA_FILE = 'schema.json'
+FORMAT_VERSION = 1
+
+def _json_default(value):
+   if isinstance(value, (datetime.date, datetime.time)):
+      return value.isoformat()
+   raise TypeError("{!r} is not JSON serializable".format(value))
+
+def _map(file_path, dtype, count):
+   """Map a flat file as a read-only array without reading it.
+   Empty files can't be mapped and give an empty array
+   """
+   if not count:
+      return np.empty(0, dtype=dtype)
+   return np.memmap(file_path, dtype=dtype, mode='r', shape=(count,))
+
+class StringColumn(object):
+   """Read-only column of variable length values stored in flat buffers.
+   Value i is the UTF-8 text between offsets[i] and offsets[i + 1]
+   of the blob and valid[i] is 0 for missing values
+   """
+   def __init__(self, offsets, blob, valid, decode=None):
+      """
+      :param offsets: Array of len(column) + 1 positions in the blob
+      :param blob: Array of bytes
+      :param valid: Array with 1 for values and 0 for None
+      :param decode: Optional function applied to the decoded text
+      """
+      self._offsets = offsets
+      self._blob = blob
+      self._valid = valid
+      self._decode = decode
+
+   def __len__(self):
+      return len(self._valid)
+
+   def _value(self, index):
+      if not self._valid[index]:
+         return None
+      text = self._blob[self._offsets[index]:self._offsets[index + 1]]
+      text = text.tobytes().decode('utf-8')
+      if self._decode:
+         return self._decode(text)
+      return text
+
+   def __getitem__(self, index):
+      """Return a value for an integer index and an object array
+      of the values for a slice, a boolean mask or an array of indices
+      """
+      if isinstance(index, slice):
+         positions = range(*index.indices(len(self)))
+      elif np.ndim(index):
+         index = np.asarray(index)
+         if index.dtype == bool:
+            index = np.flatnonzero(index)
+         positions = index
+      else:
+         index = int(index)
+         if index < 0:
+            index += len(self)
+         if not 0 <= index < len(self):
+            raise IndexError("Column index out of range: {}".format(index))
+         return self._value(index)
+      array = np.empty(len(positions), dtype=object)
+      for position, index in enumerate(positions):
+         array[position] = self[index]
+      return array
+
+   def __iter__(self):
+      for index in range(len(self)):
+         yield self._value(index)
+
+   def __array__(self, dtype=None, copy=None):
+      """Decode the whole column into an object array
+      """
+      array = self[:]
+      if dtype is not None:
+         array = array.astype(dtype)
+      return array
+
+def _column_kind(column):
+   """Return 'numeric' for fixed width arrays, 'string' for texts
+   and 'json' for any other values
+   """
+   if isinstance(column, StringColumn):
+      return 'json' if column._decode else 'string'
+   column = np.asarray(column)
+   if column.dtype != object:
+      return 'numeric'
+   if all(value is None or isinstance(value, basestring) for value in column):
+      return 'string'
+   return 'json'
+
+def _write_strings(prefix, texts):
+   """Write a list of texts, None for missing values, into the offsets,
+   blob and validity files of a string column
+   """
+   offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+   valid = np.zeros(len(texts), dtype=np.uint8)
+   with open(prefix + '.blob', 'wb') as blob:
+      for index, text in enumerate(texts):
+         size = 0
+         if text is not None:
+            data = text if isinstance(text, bytes) else text.encode('utf-8')
+            blob.write(data)
+            size = len(data)
+            valid[index] = 1
+         offsets[index + 1] = offsets[index] + size
+   offsets.tofile(prefix + '.offsets')
+   valid.tofile(prefix + '.valid')
+   return int(offsets[-1])
+
+def _replace_directory(source, destination):
+   """Move a directory in place of another one, which is removed.
+   The files of the old directory are unlinked and never truncated so
+   the processes that have them mapped keep reading the old values
+   """
+   old = None
+   if os.path.exists(destination):
+      old = tempfile.mkdtemp(dir=os.path.dirname(destination),
+                             prefix='.old-' + os.path.basename(destination))
+      os.rename(destination, os.path.join(old, 'store'))
+   try:
+      os.rename(source, destination)
+   except OSError:
+      if old is not None:
+         os.rename(os.path.join(old, 'store'), destination)
+         os.rmdir(old)
+      raise
+   if old is not None:
+      # Windows can't delete the files mapped by other processes
+      shutil.rmtree(old, ignore_errors=True)
+
+def save_columns(directory, x, y, columns, epsg=None):
+   """Write point coordinates and attribute columns into flat files.
+   Numeric columns keep their fixed width type, texts are stored
+   as UTF-8 buffers and other values as JSON texts.
+   The store is written into a new directory moved in place of the old
+   one, so the old store can be the source of the columns and stays
+   readable by the processes that have it open
+   :param str directory: The directory of the store, created if needed
+   :param x: Array of x coordinates
+   :param y: Array of y coordinates
+   :param dict columns: Attribute name: array
+   :param epsg: EPSG code of the coordinates
+   """
+   directory = os.path.abspath(directory)
+   parent = os.path.dirname(directory)
+   if not os.path.isdir(parent):
+      os.makedirs(parent)
+   temp_dir = tempfile.mkdtemp(dir=parent,
+                               prefix='.new-' + os.path.basename(directory))
+   try:
+      _write_columns(temp_dir, x, y, columns, epsg)
+      _replace_directory(temp_dir, directory)
+   except Exception:
+      shutil.rmtree(temp_dir, ignore_errors=True)
+      raise
+
+def _write_columns(directory, x, y, columns, epsg):
+   """Write the files of a store into an empty directory
+   """
+   schema_path = os.path.join(directory, SCHEMA_FILE)
+   np.asarray(x, dtype='<f8').tofile(os.path.join(directory, 'x.data'))
+   np.asarray(y, dtype='<f8').tofile(os.path.join(directory, 'y.data'))
+   schema = {
+      'version': FORMAT_VERSION,
+      'epsg': epsg,
+      'count': len(x),
+      'columns': []}
+   for position, (name, column) in enumerate(sorted(columns.items())):
+      prefix = os.path.join(directory, 'column_{}'.format(position))
+      kind = _column_kind(column)
+      info = {'name': name, 'kind': kind, 'prefix': os.path.basename(prefix)}
+      if kind == 'numeric':
+         column = np.asarray(column)
+         # Store in little endian so the files are portable
+         column = column.astype(column.dtype.newbyteorder('<'))
+         column.tofile(prefix + '.data')
+         info['dtype'] = column.dtype.str
+      else:
+         if kind == 'json':
+            texts = [None if value is None else
+                     json.dumps(value, default=_json_default)
+                     for value in column]
+         else:
+            texts = list(column)
+         info['size'] = _write_strings(prefix, texts)
+      schema['columns'].append(info)
+   with open(schema_path, 'w') as schema_file:
+      json.dump(schema, schema_file, indent=2)
+
+def open_columns(directory):
+   """Map the files of a store written by save_columns.
+   Nothing is read until the values are accessed and the memory pages
+   are shared by all the processes that open the same store
+   :param str directory: The directory of the store
+   :return: x, y, columns and epsg
+   """
+   with open(os.path.join(directory, SCHEMA_FILE)) as schema_file:
+      schema = json.load(schema_file)
+   if schema['version'] != FORMAT_VERSION:
+      raise ValueError("Unsupported store version: {}".format(schema['version']))
+   count = schema['count']
+   x = _map(os.path.join(directory, 'x.data'), '<f8', count)
+   y = _map(os.path.join(directory, 'y.data'), '<f8', count)
+   columns = {}
+   for info in schema['columns']:
+      prefix = os.path.join(directory, info['prefix'])
+      if info['kind'] == 'numeric':
+         columns[info['name']] = _map(prefix + '.data', info['dtype'], count)
+      else:
+         columns[info['name']] = StringColumn(
+            _map(prefix + '.offsets', '<i8', count + 1),
+            _map(prefix + '.blob', np.uint8, info['size']),
+            _map(prefix + '.valid', np.uint8, count),
+            json.loads if info['kind'] == 'json' else None)
+   return x, y, columns, schema['epsg']
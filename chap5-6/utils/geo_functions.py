@@ -10,9 +10,49 @@ import ogr
 import osr
 import gdal
 import os
+import datetime
+import threading
+import numpy as np
 import xmltodict
+try:
+   from xml.etree.cElementTree import iterparse
+except ImportError:
+   from xml.etree.ElementTree import iterparse
+try:
+   basestring
+except NameError:
+   basestring = str
 from pprint import pprint
 
+# Version of the features produced by the readers,
+# it must change when the readers produce different features
+READER_VERSION = 2
+
+def _gpx_waypoint_to_feature(wpt):
+   """Convert a waypoint dictionary into a GeoJSON-like feature
+   Return None if the waypoint is not a geocache
+   :param dict wpt: A waypoint as parsed by xmltodict
+   """
+   geometry = [wpt.pop('@lat'), wpt.pop('@lon')]
+   # If geocache is not on the dict, skip this wpt
+   try:
+      geocache = wpt.pop('geocache')
+   except KeyError:
+      return None
+   attributes = {'status': geocache.pop('@status')}
+   # Merge the dictionaries
+   attributes.update(wpt)
+   # Some properties are overwritten
+   attributes.update(geocache)
+   # Construct a GeoJSON feature
+   feature = {
+      "type": "Feature",
+      "geometry": {
+         "type": "Point",
+         "coordinates": geometry},
+      "properties": attributes}
+   return feature
+
 def read_gpx_file(file_path):
    """Read a GPX file containing geocaching points
    :param str file_path: The full path to the file
@@ -25,50 +65,267 @@ def read_gpx_file(file_path):
 #   print(gpx_dict['gpx']['wpt'][0]['geocache'].keys())
    output = []
    for wpt in gpx_dict['gpx']['wpt']:
-      geometry = [wpt.pop('@lat'), wpt.pop('@lon')]
-      # If geocache is not on the dict, skip this wpt
-      try:
-         geocache = wpt.pop('geocache')
-      except KeyError:
-         continue
-      attributes = {'status': geocache.pop('@status')}
-      # Merge the dictionaries
-      attributes.update(wpt)
-      # Some properties are overwritten
-      attributes.update(geocache)
-      # Construct a GeoJSON feature and append to the list
-      feature = {
-         "type": "Feature",
-         "geometry": {
-            "type": "Point",
-            "coordinates": geometry},
-         "properties": attributes}
-      output.append(feature)
+      feature = _gpx_waypoint_to_feature(wpt)
+      if feature:
+         output.append(feature)
    return output
 
-def read_ogr_features(layer):
-   """Convert OGR features from a layer into dictionaries
+def _local_name(tag):
+   """Remove the namespace from an ElementTree tag
+   """
+   return tag.rsplit('}', 1)[-1]
+
+def _qualified_name(tag, prefixes):
+   """Replace the namespace of an ElementTree tag with its prefix,
+   the names in the default namespace have no prefix as in xmltodict
+   :param dict prefixes: Prefixes of the documents by namespace URI
+   """
+   if not tag.startswith('{'):
+      return tag
+   uri, name = tag[1:].split('}', 1)
+   prefix = prefixes.get(uri)
+   return '{}:{}'.format(prefix, name) if prefix else name
+
+def _element_to_dict(element, prefixes=None):
+   """Convert an ElementTree element into a dictionary
+   following the same conventions as xmltodict
+   :param element: ElementTree element
+   :param dict prefixes: Prefixes of the document by namespace URI,
+   the namespaces are removed from the names if None
+   """
+   prefixes = prefixes or {}
+   result = {}
+   for key, value in element.attrib.items():
+      result['@' + _qualified_name(key, prefixes)] = value
+   for child in element:
+      key = _qualified_name(child.tag, prefixes)
+      value = _element_to_dict(child, prefixes)
+      if key in result:
+         # Repeated elements are grouped in a list
+         if not isinstance(result[key], list):
+            result[key] = [result[key]]
+         result[key].append(value)
+      else:
+         result[key] = value
+   text = element.text.strip() if element.text else None
+   if not result:
+      return text or None
+   if text:
+      result['#text'] = text
+   return result
+
+def _create_gpx_information():
+   """Return the information of a GPX file before it's read.
+   GPX coordinates are always in WGS84
+   """
+   return {
+      'bbox': None,
+      'epsg': '4326',
+      'type': 'Point',
+      'attributes': []}
+
+def _update_gpx_information(info, feature):
+   """Update the information of a GPX file with a feature
+   :param dict info: Information created by _create_gpx_information
+   :param dict feature: A feature read from the file
+   """
+   lat, lon = feature['geometry']['coordinates']
+   x, y = float(lon), float(lat)
+   bbox = info['bbox']
+   if bbox is None:
+      info['bbox'] = dict(xmin=x, xmax=x, ymin=y, ymax=y)
+   else:
+      bbox['xmin'] = min(bbox['xmin'], x)
+      bbox['xmax'] = max(bbox['xmax'], x)
+      bbox['ymin'] = min(bbox['ymin'], y)
+      bbox['ymax'] = max(bbox['ymax'], y)
+   # Waypoints don't share the same fields, keep all of them
+   for key in feature['properties']:
+      if key not in info['attributes']:
+         info['attributes'].append(key)
+
+def iter_gpx_file(file_path, info=None, fields=None):
+   """Read a GPX file containing geocaching points incrementally.
+   Yield one feature per waypoint, the memory used doesn't depend
+   on the size of the file. The features have the same keys as those
+   of read_gpx_file, the namespace declarations aside
+   :param str file_path: The full path to the file
+   :param dict info: Optional dictionary created by _create_gpx_information.
+   It's updated with the bbox and the attributes while the file is read
+   :param fields: Names of the attributes to keep or None to keep all of them
+   """
+   if fields is not None:
+      fields = set(field.lower() for field in fields)
+   context = iterparse(file_path, events=('start-ns', 'start', 'end'))
+   # The prefixes keep the names of the other namespaces as in xmltodict
+   prefixes = {}
+   root = None
+   for event, element in context:
+      if event == 'start-ns':
+         prefix, uri = element
+         prefixes.setdefault(uri, prefix)
+         continue
+      if root is None:
+         # The first element is the root
+         root = element
+      if event != 'end' or _local_name(element.tag) != 'wpt':
+         continue
+      feature = _gpx_waypoint_to_feature(_element_to_dict(element, prefixes))
+      # Free the waypoints already consumed
+      root.clear()
+      if feature:
+         if fields is not None:
+            feature['properties'] = dict(
+               (key, value) for key, value in feature['properties'].items()
+               if key.lower() in fields)
+         if info is not None:
+            _update_gpx_information(info, feature)
+         yield feature
+
+def _read_string_field(feature, index):
+   return feature.GetFieldAsString(index)
+
+def _read_integer_field(feature, index):
+   return feature.GetFieldAsInteger(index)
+
+def _read_integer64_field(feature, index):
+   return feature.GetFieldAsInteger64(index)
+
+def _read_real_field(feature, index):
+   return feature.GetFieldAsDouble(index)
+
+def _read_date_field(feature, index):
+   year, month, day = feature.GetFieldAsDateTime(index)[:3]
+   # Empty dates are read as year 0
+   if not year:
+      return None
+   return datetime.date(year, month, day)
+
+def _split_seconds(second):
+   """Split float seconds into seconds and microseconds
+   """
+   second = float(second)
+   return int(second), int((second - int(second)) * 1000000)
+
+def _read_datetime_field(feature, index):
+   year, month, day, hour, minute, second = \
+      feature.GetFieldAsDateTime(index)[:6]
+   if not year:
+      return None
+   second, microsecond = _split_seconds(second)
+   return datetime.datetime(year, month, day, hour, minute, second,
+                            microsecond)
+
+def _read_time_field(feature, index):
+   hour, minute, second = feature.GetFieldAsDateTime(index)[3:6]
+   second, microsecond = _split_seconds(second)
+   return datetime.time(hour, minute, second, microsecond)
+
+# Functions reading the native value of each OGR field type
+FIELD_READERS = {
+   ogr.OFTInteger: _read_integer_field,
+   ogr.OFTInteger64: _read_integer64_field,
+   ogr.OFTReal: _read_real_field,
+   ogr.OFTDate: _read_date_field,
+   ogr.OFTDateTime: _read_datetime_field,
+   ogr.OFTTime: _read_time_field}
+
+def _has_value(feature, index):
+   """Check if a field of an OGR feature has a value.
+   Since GDAL 2.2 empty values can be set but null
+   """
+   try:
+      return feature.IsFieldSetAndNotNull(index)
+   except AttributeError:
+      # GDAL < 2.2
+      return feature.IsFieldSet(index)
+
+def _select_fields(names, fields):
+   """Return the positions of the names selected by fields.
+   The names are compared case insensitively
+   :param names: A list of field names
+   :param fields: Names to select or None to select all of them
+   """
+   if fields is None:
+      return list(range(len(names)))
+   selected = set(field.lower() for field in fields)
+   return [i for i, name in enumerate(names) if name.lower() in selected]
+
+def _get_field_readers(layer_defn, typed=True, fields=None):
+   """Return a list of (index, name, reader) for the fields of a layer
+   :param layer_defn: OGR layer definition
+   :param bool typed: True to read native values, False to read strings
+   :param fields: Names of the fields to read or None to read all of them
+   """
+   field_defns = [layer_defn.GetFieldDefn(index)
+                  for index in range(layer_defn.GetFieldCount())]
+   names = [field_defn.GetName() for field_defn in field_defns]
+   readers = []
+   for index in _select_fields(names, fields):
+      reader = _read_string_field
+      if typed:
+         field_type = field_defns[index].GetType()
+         reader = FIELD_READERS.get(field_type, _read_string_field)
+      readers.append((index, names[index], reader))
+   return readers
+
+def iter_ogr_features(layer, geometry_format='wkt', typed=False, fields=None):
+   """Convert OGR features from a layer into dictionaries, one at a time
    :param layer: OGR layer
+   :param str geometry_format: 'wkt' or 'wkb'. WKB geometries are
+   flagged with a format key in the geometry of the feature
+   :param bool typed: True to read integer, real and date fields as
+   native values and empty fields as None, False to read strings
+   :param fields: Names of the fields to read or None to read all of them
    """
-   features = []
-   layer_defn = layer.GetLayerDefn()
+   if geometry_format not in ('wkt', 'wkb'):
+      raise ValueError("This geometry format is not defined: {}".format(
+         geometry_format))
+   readers = _get_field_readers(layer.GetLayerDefn(), typed, fields)
    layer.ResetReading()
    type = ogr.GeometryTypeToName(layer.GetGeomType())
    for item in layer:
       attributes = {}
-      for index in range(layer_defn.GetFieldCount()):
-         field_defn = layer_defn.GetFieldDefn(index)
-         key = field_defn.GetName()
-         value = item.GetFieldAsString(index)
-         attributes[key] = value
+      for index, key, reader in readers:
+         if typed and not _has_value(item, index):
+            attributes[key] = None
+         else:
+            attributes[key] = reader(item, index)
+      geometry = {"type": type}
+      if geometry_format == 'wkb':
+         geometry["format"] = 'wkb'
+         geometry["coordinates"] = bytes(item.GetGeometryRef().ExportToWkb())
+      else:
+         geometry["coordinates"] = item.GetGeometryRef().ExportToWkt()
       feature = {
          "type": "Feature",
-         "geometry": {
-            "type": type,
-            "coordinates": item.GetGeometryRef().ExportToWkt()},
+         "geometry": geometry,
          "properties": attributes}
-      features.append(feature)
-   return features
+      yield feature
+
+def read_ogr_features(layer, geometry_format='wkt', typed=False, fields=None):
+   """Convert OGR features from a layer into dictionaries
+   :param layer: OGR layer
+   :param str geometry_format: 'wkt' or 'wkb'
+   :param bool typed: True to read native values, False to read strings
+   :param fields: Names of the fields to read or None to read all of them
+   """
+   return list(iter_ogr_features(layer, geometry_format, typed, fields))
+
+def _get_layer_epsg(layer):
+   srs = layer.GetSpatialRef()
+   if srs:
+      return srs.GetAttrValue('authority', 1)
+   return 'not available'
+
+def get_file_epsg(file_path):
+   """Return the EPSG code of a vector file without reading its features
+   :param str file_path: The full path to the file
+   """
+   if _is_gpx_file(file_path):
+      return _create_gpx_information()['epsg']
+   datasource = _open_datasource(file_path)
+   return _get_layer_epsg(datasource.GetLayerByIndex(0))
 
 def get_datasource_information(datasource, print_results=False):
    """Get information about the first layer in the datasource
@@ -80,11 +337,7 @@ def get_datasource_information(datasource, print_results=False):
    bbox = layer.GetExtent()
    # bounding box: upper-left and lower-right
    info['bbox'] = dict(xmin=bbox[0], xmax=bbox[1], ymin=bbox[2], ymax=bbox[3])
-   srs = layer.GetSpatialRef()
-   if srs:
-      info['epsg'] = srs.GetAttrValue('authority', 1)
-   else:
-      info['epsg'] = 'not available'
+   info['epsg'] = _get_layer_epsg(layer)
    info['type'] = ogr.GeometryTypeToName(layer.GetGeomType())
    # Get the attributes names
    info['attributes'] = []
@@ -96,9 +349,8 @@ def get_datasource_information(datasource, print_results=False):
       pprint(info)
    return info
 
-def open_vector_file(file_path):
-   """Open a vector file compatible with OGR or a GPX file.
-   Return a list of features and information about the file
+def _open_datasource(file_path):
+   """Open a file with OGR and raise an IOError if it fails
    :param str file_path: The full path to the file
    """
    datasource = ogr.Open(file_path)
@@ -109,17 +361,110 @@ def open_vector_file(file_path):
       else:
          message = "File format is invalid"
       raise IOError('Error opening the file {}\n{}'.format(file_path, message))
-   
-   metadata = get_datasource_information(datasource)
+   return datasource
+
+def _is_gpx_file(file_path):
+   """Check if a file is a GPX file by its extension.
+   Raise an IOError if a GPX file doesn't exist
+   :param str file_path: The full path to the file
+   """
    file_name, file_extension = os.path.splitext(file_path)
-   # Check if it's a GPX and read it if so
-   if file_extension.lower() == '.gpx':
-      features = read_gpx_file(file_path)
+   if file_extension.lower() != '.gpx':
+      return False
+   if not os.path.isfile(file_path):
+      raise IOError('Error opening the file {}\nWrong path'.format(file_path))
+   return True
+
+def open_vector_file(file_path):
+   """Open a vector file compatible with OGR or a GPX file.
+   Return a list of features and information about the file
+   :param str file_path: The full path to the file
+   """
+   # GPX files are read in a single pass that also gets the information
+   if _is_gpx_file(file_path):
+      metadata = _create_gpx_information()
+      features = list(iter_gpx_file(file_path, metadata))
+      return features, metadata
    # If not, use OGR to get the features
-   else:
-      features = read_ogr_features(datasource.GetLayerByIndex(0))
+   datasource = _open_datasource(file_path)
+   metadata = get_datasource_information(datasource)
+   features = read_ogr_features(datasource.GetLayerByIndex(0))
    return features, metadata
 
+def iter_chunks(iterable, chunk_size):
+   """Group the items of an iterable into lists of chunk_size items
+   :param iterable: Any iterable
+   :param int chunk_size: Maximum number of items per chunk
+   """
+   chunk = []
+   for item in iterable:
+      chunk.append(item)
+      if len(chunk) == chunk_size:
+         yield chunk
+         chunk = []
+   if chunk:
+      yield chunk
+
+def _iter_datasource_features(datasource, geometry_format, typed, fields):
+   """Yield the features of the first layer of a datasource.
+   The generator keeps a reference to the datasource while
+   the layer is being read
+   :param datasource: An OGR datasource
+   :param str geometry_format: 'wkt' or 'wkb'
+   :param bool typed: True to read native values, False to read strings
+   :param fields: Names of the fields to read or None to read all of them
+   """
+   layer = datasource.GetLayerByIndex(0)
+   for feature in iter_ogr_features(layer, geometry_format, typed, fields):
+      yield feature
+
+def iter_vector_file(file_path, chunk_size=1000, geometry_format='wkb',
+                     typed=True, fields=None):
+   """Open a vector file compatible with OGR or a GPX file.
+   Return a generator of lists with at most chunk_size features
+   and information about the file. The features are read while
+   the chunks are consumed. For GPX files the bbox and the attributes
+   of the information are only complete after all chunks are consumed
+   :param str file_path: The full path to the file
+   :param int chunk_size: Number of features per chunk
+   :param str geometry_format: 'wkt' or 'wkb' for the OGR geometries
+   :param bool typed: True to read native values from the OGR fields.
+   GPX attributes are always strings
+   :param fields: Names of the attributes to read or None to read all of them
+   """
+   if _is_gpx_file(file_path):
+      metadata = _create_gpx_information()
+      features = iter_gpx_file(file_path, metadata, fields)
+   else:
+      datasource = _open_datasource(file_path)
+      metadata = get_datasource_information(datasource)
+      names = metadata['attributes']
+      metadata['attributes'] = [names[i] for i in _select_fields(names, fields)]
+      features = _iter_datasource_features(datasource, geometry_format,
+                                           typed, fields)
+   return iter_chunks(features, chunk_size), metadata
+
+# Extensions of the files read from a directory
+VECTOR_EXTENSIONS = ('.gpx', '.shp', '.geojson', '.json', '.kml', '.gml',
+                     '.gpkg', '.sqlite')
+
+def expand_file_paths(file_paths):
+   """Return a list of files from a path or a list of paths.
+   Directories are replaced by the vector files they contain
+   :param file_paths: A path or a list of files and directories
+   """
+   if isinstance(file_paths, basestring):
+      file_paths = [file_paths]
+   result = []
+   for file_path in file_paths:
+      if not os.path.isdir(file_path):
+         result.append(file_path)
+         continue
+      for name in sorted(os.listdir(file_path)):
+         if os.path.splitext(name)[1].lower() in VECTOR_EXTENSIONS:
+            result.append(os.path.join(file_path, name))
+   return result
+
 def convert_length_unit(value, unit='km', decimal_places=2):
    """Convert the length unit of a given value.
    The input is in meters and the output is set by the unit argument
@@ -135,6 +480,29 @@ def convert_length_unit(value, unit='km', decimal_places=2):
    if unit not in conversion_factor:
       raise ValueError("This unit is not defined: {}".format(unit))
    
+   # Arrays of values are rounded element by element
+   if isinstance(value, np.ndarray):
+      return np.round(value * conversion_factor[unit], decimal_places)
+   return round(value * conversion_factor[unit], decimal_places)
+
+def convert_area_unit(value, unit='km2', decimal_places=2):
+   """Convert the area unit of a given value.
+   The input is in square meters and the output is set by the unit argument
+   :param value: Input value in square meters
+   :param unit: The desired output unit
+   :param decimal_places: Number of decimal places of the output
+   """
+   conversion_factor = {
+      'sqmi': 1 / 2589988.11,
+      'km2': 0.000001,
+      'm2': 1.0}
+   
+   if unit not in conversion_factor:
+      raise ValueError("This unit is not defined: {}".format(unit))
+   
+   # Arrays of values are rounded element by element
+   if isinstance(value, np.ndarray):
+      return np.round(value * conversion_factor[unit], decimal_places)
    return round(value * conversion_factor[unit], decimal_places)
 
 def calculate_areas(geometries, unity='km2'):
@@ -166,19 +534,46 @@ def create_transform(src_epsg, dst_epsg):
    dst_srs.ImportFromEPSG(dst_epsg)
    return osr.CoordinateTransformation(src_srs, dst_srs)
 
+# Transformations created by get_transform, one dictionary per thread
+_transforms = threading.local()
+
+def get_transform(src_epsg, dst_epsg):
+   """Return a cached OSR transformation between two EPSG codes.
+   OSR transformations must not be used by several threads at the same
+   time, so each thread gets its own cache
+   :param src_epsg: EPSG code for the source geometry
+   :param dst_epsg: EPSG code for the destination geometry
+   :return: osr.CoordinateTransformation
+   """
+   cache = getattr(_transforms, 'cache', None)
+   if cache is None:
+      cache = _transforms.cache = {}
+   key = (int(src_epsg), int(dst_epsg))
+   if key not in cache:
+      cache[key] = create_transform(*key)
+   return cache[key]
+
 def transform_points(points, src_epsg=4326, dst_epsg=3395):
    """Transform the coordinate reference system of a list of coordinates (a list of points)
+   or of a NumPy array of coordinates, which returns an array of the same shape
+   :param points: A list of points or an (N, 2) array
    :param src_epsg: EPSG code for the source geometry
    :param dst_epsg: EPSG code for the destination geometry
    """
-   transformation = create_transform(src_epsg, dst_epsg)
+   transformation = get_transform(src_epsg, dst_epsg)
+   # Packed coordinate arrays are transformed into arrays
+   if isinstance(points, np.ndarray):
+      if not len(points):
+         return points.astype(np.float64)
+      result = transformation.TransformPoints(points[:, :2].tolist())
+      return np.array(result, dtype=np.float64)[:, :points.shape[1]]
    points = transformation.TransformPoints(points)
    return points
 
 def transform_geometries(datasource, src_epsg, dst_epsg):
    """Transform the coordinates of all geometries in the first layer"""
    # Part 1
-   transformation = create_transform(src_epsg, dst_epsg)
+   transformation = get_transform(src_epsg, dst_epsg)
    layer = datasource.GetLayerByIndex(0)
    
    # Part 2
@@ -197,7 +592,7 @@ def transform_geometry(geom, src_epsg=4326, dst_epsg=3395):
    :param dst_epsg: EPSG code for the destination geometry
    """
    ogr_geom = ogr.CreateGeometryFromWkb(geom)
-   ogr_transformation = create_transform(src_epsg, dst_epsg)
+   ogr_transformation = get_transform(src_epsg, dst_epsg)
    ogr_geom.Transform(ogr_transformation)
    return ogr_geom.ExportToWkb()
 
@@ -0,0 +1,254 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:02:44 2026
+
+@author: phunh
+"""
+
+import numpy as np
+from utils.geometry_arrays import pack_sequences
+
+# Mean radius of the Earth in meters
+EARTH_RADIUS = 6371008.8
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+WGS84_E = np.sqrt(WGS84_F * (2 - WGS84_F))
+
+def _radians(*values):
+   """Convert degrees into broadcast float arrays of radians
+   """
+   return np.broadcast_arrays(*[np.radians(np.asarray(value, dtype=np.float64))
+                                for value in values])
+
+def haversine(lon1, lat1, lon2, lat2, radius=EARTH_RADIUS):
+   """Great circle distance between points on a sphere.
+   The arguments are arrays in degrees that are broadcast together
+   :param radius: Radius of the sphere in meters
+   :return: Distances in meters
+   """
+   lon1, lat1, lon2, lat2 = _radians(lon1, lat1, lon2, lat2)
+   a = (np.sin((lat2 - lat1) / 2) ** 2 +
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+   return 2 * radius * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def vincenty(lon1, lat1, lon2, lat2, max_iterations=200, tolerance=1e-12):
+   """Distance between points on the WGS84 ellipsoid with the inverse
+   Vincenty formula. The arguments are arrays in degrees that are
+   broadcast together. Nearly antipodal points, where the formula
+   doesn't converge, get the haversine distance
+   :param int max_iterations: Maximum number of iterations
+   :param float tolerance: Convergence of the longitude on the sphere
+   :return: Distances in meters
+   """
+   rad_lon1, rad_lat1, rad_lon2, rad_lat2 = _radians(lon1, lat1, lon2, lat2)
+   f = WGS84_F
+   L = rad_lon2 - rad_lon1
+   U1 = np.arctan((1 - f) * np.tan(rad_lat1))
+   U2 = np.arctan((1 - f) * np.tan(rad_lat2))
+   sin_u1, cos_u1 = np.sin(U1), np.cos(U1)
+   sin_u2, cos_u2 = np.sin(U2), np.cos(U2)
+   lam = L
+   with np.errstate(invalid='ignore', divide='ignore'):
+      for _ in range(max_iterations):
+         sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+         sin_sigma = np.hypot(cos_u2 * sin_lam,
+                              cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+         cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+         sigma = np.arctan2(sin_sigma, cos_sigma)
+         # Coincident points have sin_sigma == 0
+         sin_alpha = np.where(sin_sigma == 0, 0,
+                              cos_u1 * cos_u2 * sin_lam / sin_sigma)
+         cos2_alpha = 1 - sin_alpha ** 2
+         # Points on the equator have cos2_alpha == 0
+         cos_2sm = np.where(cos2_alpha == 0, 0,
+                            cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+         C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+         previous = lam
+         lam = L + (1 - C) * f * sin_alpha * (
+            sigma + C * sin_sigma * (
+               cos_2sm + C * cos_sigma * (-1 + 2 * cos_2sm ** 2)))
+         not_converged = np.abs(lam - previous) > tolerance
+         if not np.any(not_converged):
+            break
+      u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+      A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+      B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+      delta_sigma = B * sin_sigma * (
+         cos_2sm + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sm ** 2) -
+            B / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) *
+            (-3 + 4 * cos_2sm ** 2)))
+      distances = WGS84_B * A * (sigma - delta_sigma)
+   if np.any(not_converged):
+      fallback = haversine(lon1, lat1, lon2, lat2)
+      distances = np.where(not_converged, fallback, distances)
+   return distances
+
+# Distance functions by method name
+METHODS = {
+   'haversine': haversine,
+   'vincenty': vincenty}
+
+def _get_method(method):
+   if method not in METHODS:
+      raise ValueError("This method is not defined: {}".format(method))
+   return METHODS[method]
+
+def distances_to_point(lon, lat, lons, lats, method='haversine'):
+   """Distances from one point to many points
+   :param lon: Longitude of the point in degrees
+   :param lat: Latitude of the point in degrees
+   :param lons: Array of longitudes in degrees
+   :param lats: Array of latitudes in degrees
+   :param str method: 'haversine' (sphere) or 'vincenty' (WGS84 ellipsoid)
+   :return: Array of distances in meters
+   """
+   return _get_method(method)(lon, lat, np.asarray(lons), np.asarray(lats))
+
+def unit_vectors(lons, lats):
+   """Convert longitudes and latitudes into an (N, 3) array of vectors
+   on the unit sphere. The chord between two vectors grows with the
+   great circle distance, the closest vectors are the closest points
+   :param lons: Array of longitudes in degrees
+   :param lats: Array of latitudes in degrees
+   """
+   lons, lats = _radians(lons, lats)
+   cos_lats = np.cos(lats)
+   return np.column_stack([(cos_lats * np.cos(lons)).ravel(),
+                           (cos_lats * np.sin(lons)).ravel(),
+                           np.sin(lats).ravel()])
+
+def distance_to_chord(distance, radius=EARTH_RADIUS):
+   """Return the chord between unit_vectors of points at a
+   great circle distance
+   :param distance: Distance in meters
+   :param radius: Radius of the sphere in meters
+   """
+   angle = np.minimum(np.asarray(distance, dtype=np.float64) / radius, np.pi)
+   return 2 * np.sin(angle / 2)
+
+def iter_distance_matrix(lons1, lats1, lons2, lats2, method='haversine',
+                         chunk_size=1000):
+   """Distances from many points to many points, computed for chunk_size
+   points of the first set at a time so the memory stays bounded
+   :param lons1: Array of longitudes of the first set of points
+   :param lats1: Array of latitudes of the first set of points
+   :param lons2: Array of longitudes of the second set of points
+   :param lats2: Array of latitudes of the second set of points
+   :param str method: 'haversine' (sphere) or 'vincenty' (WGS84 ellipsoid)
+   :param int chunk_size: Number of rows computed at a time
+   :return: A generator of (first row, block of distances in meters)
+   """
+   function = _get_method(method)
+   lons1 = np.asarray(lons1, dtype=np.float64)
+   lats1 = np.asarray(lats1, dtype=np.float64)
+   lons2 = np.asarray(lons2, dtype=np.float64)[np.newaxis, :]
+   lats2 = np.asarray(lats2, dtype=np.float64)[np.newaxis, :]
+   for start in range(0, len(lons1), chunk_size):
+      end = start + chunk_size
+      block = function(lons1[start:end, np.newaxis], lats1[start:end, np.newaxis],
+                       lons2, lats2)
+      yield start, block
+
+def distance_matrix(lons1, lats1, lons2, lats2, method='haversine',
+                    chunk_size=1000):
+   """Distances from many points to many points
+   :param str method: 'haversine' (sphere) or 'vincenty' (WGS84 ellipsoid)
+   :param int chunk_size: Number of rows computed at a time
+   :return: Array of distances in meters with one row per point
+   of the first set and one column per point of the second set
+   """
+   result = np.empty((len(lons1), len(lons2)), dtype=np.float64)
+   for start, block in iter_distance_matrix(lons1, lats1, lons2, lats2,
+                                            method, chunk_size):
+      result[start:start + len(block)] = block
+   return result
+
+def _segments(coordinates, sizes):
+   """Return the start and end positions of the segments of packed
+   coordinate sequences and the sequence of each segment
+   """
+   sequence = np.repeat(np.arange(len(sizes)), sizes)
+   starts = np.flatnonzero(sequence[:-1] == sequence[1:])
+   return starts, starts + 1, sequence[starts]
+
+def sequence_lengths(coordinates, sizes, method='vincenty'):
+   """Length of each coordinate sequence of a packed array
+   :param coordinates: (N, 2) array of longitudes and latitudes in degrees
+   :param sizes: Number of coordinates of each sequence
+   :param str method: 'haversine' (sphere) or 'vincenty' (WGS84 ellipsoid)
+   :return: Array of lengths in meters
+   """
+   starts, ends, sequence = _segments(coordinates, sizes)
+   distances = _get_method(method)(
+      coordinates[starts, 0], coordinates[starts, 1],
+      coordinates[ends, 0], coordinates[ends, 1])
+   return np.bincount(sequence, weights=distances, minlength=len(sizes))
+
+def _q(sin_lat):
+   e = WGS84_E
+   return (1 - e ** 2) * (sin_lat / (1 - (e * sin_lat) ** 2) -
+                          np.log((1 - e * sin_lat) / (1 + e * sin_lat)) / (2 * e))
+
+# Radius of the sphere with the same surface as the WGS84 ellipsoid
+_Q_POLE = _q(1.0)
+AUTHALIC_RADIUS = WGS84_A * np.sqrt(_Q_POLE / 2)
+
+def _authalic_latitude(lat):
+   """Latitude on the authalic sphere, in radians, of a latitude in degrees
+   """
+   q = _q(np.sin(np.radians(lat)))
+   return np.arcsin(np.clip(q / _Q_POLE, -1, 1))
+
+def ring_areas(coordinates, sizes):
+   """Area of each closed ring of a packed array on the WGS84 ellipsoid.
+   The latitudes are mapped to the authalic sphere, which keeps the areas.
+   Rings around a pole measure the cap on the side of the pole
+   :param coordinates: (N, 2) array of longitudes and latitudes in degrees
+   :param sizes: Number of coordinates of each ring
+   :return: Array of areas in square meters
+   """
+   starts, ends, ring = _segments(coordinates, sizes)
+   lon = np.radians(coordinates[:, 0])
+   tan_half = np.tan(_authalic_latitude(coordinates[:, 1]) / 2)
+   delta = lon[ends] - lon[starts]
+   # Keep the longitude differences between -pi and pi
+   delta = (delta + np.pi) % (2 * np.pi) - np.pi
+   t1 = tan_half[starts]
+   t2 = tan_half[ends]
+   # Signed spherical excess between each edge and the equator
+   excess = 2 * np.arctan2(np.tan(delta / 2) * (t1 + t2), 1 + t1 * t2)
+   total = np.abs(np.bincount(ring, weights=excess, minlength=len(sizes)))
+   # The longitudes of a ring around a pole turn by 2 pi and its excess
+   # is the band between the ring and the equator
+   turns = np.bincount(ring, weights=delta, minlength=len(sizes))
+   polar = np.abs(turns) > np.pi
+   total[polar] = 2 * np.pi - total[polar]
+   return total * AUTHALIC_RADIUS ** 2
+
+def geometry_lengths(geometries, method='vincenty'):
+   """Length of each geometry, the perimeter for polygons
+   :param geometries: A list of shapely geometries in longitude and latitude
+   :param str method: 'haversine' (sphere) or 'vincenty' (WGS84 ellipsoid)
+   :return: Array of lengths in meters
+   """
+   geometries = list(geometries)
+   packed = pack_sequences(geometries)
+   lengths = sequence_lengths(packed['coordinates'], packed['sizes'], method)
+   return np.bincount(packed['geometries'], weights=lengths,
+                      minlength=len(geometries))
+
+def geometry_areas(geometries):
+   """Area of each polygon on the WGS84 ellipsoid, without its holes
+   :param geometries: A list of shapely geometries in longitude and latitude
+   :return: Array of areas in square meters
+   """
+   geometries = list(geometries)
+   packed = pack_sequences(geometries)
+   areas = ring_areas(packed['coordinates'], packed['sizes'])
+   areas[packed['holes']] *= -1
+   return np.bincount(packed['geometries'], weights=areas,
+                      minlength=len(geometries))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:21:09 2026
+
+@author: phunh
+"""
+
+import numpy as np
+from shapely.geometry import Point, LineString, LinearRing, Polygon
+
+def _iter_sequences(geometry):
+   """Yield (coordinates, is_hole) for the coordinate sequences of a geometry
+   """
+   if geometry.is_empty:
+      return
+   geom_type = geometry.geom_type
+   if geom_type in ('Point', 'LineString', 'LinearRing'):
+      yield np.asarray(geometry.coords, dtype=np.float64)[:, :2], False
+   elif geom_type == 'Polygon':
+      yield np.asarray(geometry.exterior.coords, dtype=np.float64)[:, :2], False
+      for ring in geometry.interiors:
+         yield np.asarray(ring.coords, dtype=np.float64)[:, :2], True
+   else:
+      for part in geometry.geoms:
+         for sequence in _iter_sequences(part):
+            yield sequence
+
+def pack_sequences(geometries):
+   """Pack the coordinate sequences of many geometries into a single array
+   :param geometries: A list of shapely geometries
+   :return: A dictionary with the (N, 2) array of coordinates and, for each
+   sequence, its size, the position of its geometry and True for holes
+   """
+   sequences = []
+   sizes = []
+   owners = []
+   holes = []
+   for position, geometry in enumerate(geometries):
+      for coordinates, is_hole in _iter_sequences(geometry):
+         sequences.append(coordinates)
+         sizes.append(len(coordinates))
+         owners.append(position)
+         holes.append(is_hole)
+   if sequences:
+      coordinates = np.concatenate(sequences)
+   else:
+      coordinates = np.empty((0, 2), dtype=np.float64)
+   return {
+      'coordinates': coordinates,
+      'sizes': np.array(sizes, dtype=np.intp),
+      'geometries': np.array(owners, dtype=np.intp),
+      'holes': np.array(holes, dtype=bool)}
+
+def _rebuild(geometry, coordinates, start):
+   """Create a geometry with the structure of another one and the
+   coordinates found in an array from a given position
+   :return: The new geometry and the position after its coordinates
+   """
+   if geometry.is_empty:
+      return geometry, start
+   geom_type = geometry.geom_type
+   if geom_type == 'Point':
+      return Point(coordinates[start]), start + 1
+   if geom_type in ('LineString', 'LinearRing'):
+      end = start + len(geometry.coords)
+      new_type = LineString if geom_type == 'LineString' else LinearRing
+      return new_type(coordinates[start:end]), end
+   if geom_type == 'Polygon':
+      rings = []
+      for ring in [geometry.exterior] + list(geometry.interiors):
+         end = start + len(ring.coords)
+         rings.append(coordinates[start:end])
+         start = end
+      return Polygon(rings[0], rings[1:]), start
+   parts = []
+   for part in geometry.geoms:
+      new_part, start = _rebuild(part, coordinates, start)
+      parts.append(new_part)
+   return type(geometry)(parts), start
+
+def unpack_coordinates(geometries, coordinates):
+   """Create new geometries with the same structure as the given ones
+   and the coordinates of an array created by pack_sequences
+   :param geometries: The list of shapely geometries that was packed
+   :param coordinates: (N, 2) array with the new coordinates
+   :return: A list of shapely geometries
+   """
+   result = []
+   start = 0
+   for geometry in geometries:
+      new_geometry, start = _rebuild(geometry, coordinates, start)
+      result.append(new_geometry)
+   return result
@@ -0,0 +1,180 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:15:33 2026
+
+@author: phunh
+"""
+
+import os
+import hashlib
+import pickle
+import tempfile
+from utils.geo_functions import READER_VERSION
+
+CACHE_EXTENSION = '.cache'
+# Layout of the entries, part of the fingerprint
+CACHE_FORMAT = 2
+
+def _fingerprint(file_path, fields=None):
+   """Identify the content of a source file and the way it was read
+   :param str file_path: The full path to the file
+   :param fields: Names of the attributes imported or None for all of them
+   """
+   stat = os.stat(file_path)
+   return {
+      'path': os.path.abspath(file_path),
+      'mtime': stat.st_mtime,
+      'size': stat.st_size,
+      'version': READER_VERSION,
+      'format': CACHE_FORMAT,
+      'fields': sorted(fields) if fields is not None else None}
+
+def replace_file(source, destination):
+   """Rename a file over another one in a single step where possible,
+   so the readers see either the old or the new file
+   :param str source: The path of the new file
+   :param str destination: The path of the file to replace
+   """
+   if hasattr(os, 'replace'):
+      os.replace(source, destination)
+      return
+   # Python 2 can't rename a file over an existing one on Windows
+   if os.name == 'nt' and os.path.exists(destination):
+      os.remove(destination)
+   os.rename(source, destination)
+
+def _entry_path(cache_dir, file_path, fields=None):
+   """Return the path of the cache entry of a source file
+   """
+   key = repr((os.path.abspath(file_path),
+               sorted(fields) if fields is not None else None))
+   name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+   return os.path.join(cache_dir, name + CACHE_EXTENSION)
+
+def _read_header(entry_path):
+   """Return the fingerprint stored in a cache entry or None if it's unreadable
+   """
+   try:
+      with open(entry_path, 'rb') as entry:
+         return pickle.load(entry)
+   except Exception:
+      return None
+
+def _is_valid(header):
+   """Check if a cache entry still matches its source file
+   """
+   if not header:
+      return False
+   try:
+      return header == _fingerprint(header['path'], header['fields'])
+   except OSError:
+      # The source file doesn't exist anymore
+      return False
+
+def _remove(entry_path):
+   try:
+      os.remove(entry_path)
+   except OSError:
+      pass
+
+def evict_stale_entries(cache_dir):
+   """Remove the cache entries whose source file changed or doesn't exist
+   :param str cache_dir: Directory of the cache
+   """
+   for name in os.listdir(cache_dir):
+      if name.endswith(CACHE_EXTENSION):
+         entry_path = os.path.join(cache_dir, name)
+         if not _is_valid(_read_header(entry_path)):
+            _remove(entry_path)
+
+def _pack_chunk(features):
+   """Convert features into (geometry, keys, values) rows.
+   Features with the same attribute names share the same keys tuple
+   """
+   schemas = {}
+   rows = []
+   for feature in features:
+      properties = feature['properties']
+      keys = tuple(properties)
+      keys = schemas.setdefault(keys, keys)
+      rows.append((feature['geometry'], keys,
+                   tuple(properties[key] for key in keys)))
+   return rows
+
+def _unpack_chunk(rows):
+   return [{
+      "type": "Feature",
+      "geometry": geometry,
+      "properties": dict(zip(keys, values))}
+      for geometry, keys, values in rows]
+
+def _iter_entry(entry_path, metadata):
+   """Yield the chunks of features stored in a cache entry.
+   The metadata is updated once all chunks are read
+   """
+   with open(entry_path, 'rb') as entry:
+      # Skip the fingerprint and the EPSG code
+      pickle.load(entry)
+      pickle.load(entry)
+      while True:
+         record = pickle.load(entry)
+         if record[0] == 'metadata':
+            metadata.update(record[1])
+            return
+         yield _unpack_chunk(record[1])
+
+def load_features(cache_dir, file_path, fields=None):
+   """Read the features of a file from the cache.
+   Stale entries are removed
+   :param str cache_dir: Directory of the cache
+   :param str file_path: The full path to the source file
+   :param fields: Names of the attributes imported or None for all of them
+   :return: A generator of feature chunks and the metadata, which only
+   has the EPSG code until all chunks are consumed, or None if there's
+   no valid entry
+   """
+   entry_path = _entry_path(cache_dir, file_path, fields)
+   if not os.path.isfile(entry_path):
+      return None
+   header = _read_header(entry_path)
+   if not _is_valid(header) or header['path'] != os.path.abspath(file_path):
+      _remove(entry_path)
+      return None
+   with open(entry_path, 'rb') as entry:
+      pickle.load(entry)
+      metadata = {'epsg': pickle.load(entry)}
+   return _iter_entry(entry_path, metadata), metadata
+
+def save_features(cache_dir, file_path, chunks, metadata, fields=None):
+   """Write the chunks of features read from a file into the cache
+   while they are consumed. The entry is only created if all chunks
+   are consumed
+   :param str cache_dir: Directory of the cache
+   :param str file_path: The full path to the source file
+   :param chunks: An iterable of lists of features
+   :param dict metadata: Information about the file
+   :param fields: Names of the attributes imported or None for all of them
+   :return: A generator of the same chunks
+   """
+   if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+   fingerprint = _fingerprint(file_path, fields)
+   handle, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+   complete = False
+   try:
+      with os.fdopen(handle, 'wb') as entry:
+         pickle.dump(fingerprint, entry, pickle.HIGHEST_PROTOCOL)
+         # The EPSG code is known before the features are read
+         pickle.dump(metadata['epsg'], entry, pickle.HIGHEST_PROTOCOL)
+         for chunk in chunks:
+            pickle.dump(('chunk', _pack_chunk(chunk)), entry,
+                        pickle.HIGHEST_PROTOCOL)
+            yield chunk
+         pickle.dump(('metadata', metadata), entry, pickle.HIGHEST_PROTOCOL)
+      replace_file(temp_path, _entry_path(cache_dir, file_path, fields))
+      complete = True
+      evict_stale_entries(cache_dir)
+   finally:
+      if not complete:
+         _remove(temp_path)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:05:17 2026
+
+@author: phunh
+"""
+
+import numpy as np
+from shapely.geometry import box
+from shapely.strtree import STRtree
+from shapely.prepared import PreparedGeometry
+try:
+   # Shapely >= 2.0
+   from shapely import contains_xy as _contains_xy
+   _PREPARED_INPUT = False
+except ImportError:
+   from shapely.vectorized import contains as _contains_xy
+   _PREPARED_INPUT = True
+
+def contains_points(geometry, x, y):
+   """Test which points are inside a geometry with a single vectorised call
+   :param geometry: A shapely geometry or a prepared geometry
+   :param x: Array of x coordinates
+   :param y: Array of y coordinates
+   :return: A boolean array
+   """
+   x = np.asarray(x, dtype=np.float64)
+   y = np.asarray(y, dtype=np.float64)
+   if not len(x):
+      return np.zeros(0, dtype=bool)
+   # With shapely 2.0 prep() prepares the original geometry in place
+   if isinstance(geometry, PreparedGeometry) and not _PREPARED_INPUT:
+      geometry = geometry.context
+   return np.asarray(_contains_xy(geometry, x, y), dtype=bool)
+
+class SpatialIndex(object):
+   """STR-tree over a list of shapely geometries.
+   Queries return the positions of the geometries in the list
+   """
+   def __init__(self, geometries):
+      """
+      :param geometries: A list of shapely geometries
+      """
+      geometries = list(geometries)
+      self._tree = STRtree(geometries) if geometries else None
+      # Shapely < 2.0 returns the geometries instead of their positions
+      self._positions = {}
+      for position, geometry in enumerate(geometries):
+         self._positions.setdefault(id(geometry), []).append(position)
+
+   def query(self, bounds):
+      """Return the sorted positions of the geometries whose bounding box
+      intersects the given bounds
+      :param bounds: (xmin, ymin, xmax, ymax)
+      """
+      if self._tree is None:
+         return np.empty(0, dtype=np.intp)
+      result = self._tree.query(box(*bounds))
+      if isinstance(result, np.ndarray) and result.dtype.kind in 'iu':
+         positions = result
+      else:
+         positions = [p for geometry in result
+                      for p in self._positions[id(geometry)]]
+      return np.unique(np.asarray(positions, dtype=np.intp))
+
+class PointIndex(object):
+   """Index over point coordinates sorted by x.
+   A query searches the x range and then filters the y values
+   """
+   def __init__(self, x, y):
+      """
+      :param x: Array of x coordinates
+      :param y: Array of y coordinates
+      """
+      self._order = np.argsort(x, kind='mergesort')
+      self._x = np.asarray(x)[self._order]
+      self._y = np.asarray(y)[self._order]
+
+   def query(self, bounds):
+      """Return the sorted positions of the points inside the given bounds
+      :param bounds: (xmin, ymin, xmax, ymax)
+      """
+      xmin, ymin, xmax, ymax = bounds
+      start = np.searchsorted(self._x, xmin, side='left')
+      end = np.searchsorted(self._x, xmax, side='right')
+      y = self._y[start:end]
+      inside = (y >= ymin) & (y <= ymax)
+      return np.sort(self._order[start:end][inside])
@@ -0,0 +1,94 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:58:14 2026
+
+@author: phunh
+"""
+
+from multiprocessing import Pool
+import numpy as np
+from shapely import wkb
+from shapely.prepared import prep
+from utils.spatial_index import SpatialIndex, PointIndex, contains_points
+
+# Geometries of the worker processes, set by _init_worker
+_worker_geometries = None
+
+class _Geometries(object):
+   """Geometries to join with their index and prepared geometries
+   """
+   def __init__(self, geometries):
+      self.geometries = list(geometries)
+      self.prepared = [prep(geometry) for geometry in self.geometries]
+      self.index = SpatialIndex(self.geometries)
+
+def _join_slab(x, y, geometries):
+   """Find the geometry containing each point of a group of points
+   :param x: Array of x coordinates
+   :param y: Array of y coordinates
+   :param geometries: A _Geometries object
+   :return: Array with the position of the geometry or -1
+   """
+   result = np.full(len(x), -1, dtype=np.intp)
+   if not len(x):
+      return result
+   points = PointIndex(x, y)
+   # Only the geometries that intersect the slab are tested
+   bounds = (x.min(), y.min(), x.max(), y.max())
+   for position in geometries.index.query(bounds):
+      candidates = points.query(geometries.geometries[position].bounds)
+      # A point keeps the first geometry that contains it
+      candidates = candidates[result[candidates] < 0]
+      if len(candidates):
+         inside = contains_points(geometries.prepared[position],
+                                  x[candidates], y[candidates])
+         result[candidates[inside]] = position
+   return result
+
+def _init_worker(wkbs):
+   global _worker_geometries
+   _worker_geometries = _Geometries(wkb.loads(data) for data in wkbs)
+
+def _join_worker(args):
+   x, y = args
+   return _join_slab(x, y, _worker_geometries)
+
+def spatial_join(x, y, geometries, processes=None, chunk_size=100000):
+   """Find the geometry containing each point in a single pass.
+   The points are sorted by x and split into slabs of chunk_size points,
+   each slab is only tested against the geometries whose bounding box
+   intersects it. The slabs are joined in a pool of processes when
+   there's more than one
+   :param x: Array of x coordinates
+   :param y: Array of y coordinates
+   :param geometries: A list of shapely polygons
+   :param int processes: Number of processes, None for the number of CPUs
+   and 1 to join in this process
+   :param int chunk_size: Number of points per slab
+   :return: An array with the position of the geometry containing each
+   point or -1 and an array with the number of points in each geometry
+   """
+   x = np.asarray(x, dtype=np.float64)
+   y = np.asarray(y, dtype=np.float64)
+   geometries = list(geometries)
+   order = np.argsort(x, kind='mergesort')
+   slabs = [order[start:start + chunk_size]
+            for start in range(0, len(order), chunk_size)]
+   if processes == 1 or len(slabs) < 2:
+      prepared = _Geometries(geometries)
+      results = [_join_slab(x[slab], y[slab], prepared) for slab in slabs]
+   else:
+      pool = Pool(processes, initializer=_init_worker,
+                  initargs=([geometry.wkb for geometry in geometries],))
+      try:
+         results = pool.map(_join_worker,
+                            [(x[slab], y[slab]) for slab in slabs])
+      finally:
+         pool.close()
+         pool.join()
+   indices = np.full(len(x), -1, dtype=np.intp)
+   for slab, result in zip(slabs, results):
+      indices[slab] = result
+   counts = np.bincount(indices[indices >= 0], minlength=len(geometries))
+   return indices, counts